@@ -10,9 +10,23 @@ Created on 02/01/2017
 import bellagio.SystemLib.testbed_logging.testbedlog as tblog
 from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
 from bellagio.SystemLib.LnK.bin2lnk import Bin2Lnk
+from bellagio.SystemLib.LnK import swire_frames
+from bellagio.SystemLib.LnK.swire_frames import SwireFrames, LnkXmlSerializer, frame_serializers
+from bellagio.SystemLib.LnK.lnk_progress import LnkProgress, atomicOutput
+from bellagio.SystemLib.LnK.lnk_output import outputName, openInput, OutputSink
 import os
 import re
 import datetime
+import binascii
+import hashlib
+import json
+import math
+import functools
+import collections
+import multiprocessing
+import tempfile
+import shutil
+from fractions import gcd
 from __builtin__ import classmethod
 
 #index of list
@@ -66,6 +80,11 @@ swire_route_def = {
     24 : [3, 3, 1],
     }
 
+#shapiro route control registers
+shapiro_route_start = 0x8032            #start route: route number
+shapiro_route_stop  = 0x8033            #stop route
+shapiro_cmd_regs    = (0x800c, 0x800d)  #route command/parameter pairs, written as a sequence
+
 #shapiro samplerate(KHz) register(0x8030) value LUT
 samplerate_reg_val = {
     8   : 0,
@@ -126,6 +145,124 @@ swire_cols_ctrl = {
     14 : 6,
     16 : 7 }
 
+#frames of swire dynamic sync period
+swire_dsync_period = 15
+
+
+class CtrlPortChunkRenderer(object):
+    '''
+    render CP content block for a chunk of dwords
+    chunks only depend on their start event number and data, so they can render in any order/process
+    '''
+    def __init__(self, records, event_inc, dword_bytes):
+        '''
+            records, event_inc: parseCtrlPortContent() result
+            dword_bytes: input bytes per dword
+        '''
+        self.block = SwireFrames()
+        for record in records:
+            self.block.add(*record[:12])
+        self.event_offsets = self.block.event.tolist()
+        self.data_index = [record[12] for record in records]
+        self.event_inc = event_inc
+        self.dword_bytes = dword_bytes
+        self.serializer = LnkXmlSerializer()
+
+    def render(self, event_start, chunk_data):
+        '''
+            event_start: event number of first dword
+            chunk_data: input bytes of the chunk
+        return xml text of chunk
+        '''
+        return ''.join(self.serializer.render(self.frames(event_start, chunk_data)))
+
+    def frames(self, event_start, chunk_data):
+        '''
+        return IR of chunk
+        '''
+        data = bytearray(chunk_data)
+        count = len(data) / self.dword_bytes
+        frames_data = [data[d*self.dword_bytes + index] if index >= 0 else value for d in range(count) for (index, value) in zip(self.data_index, self.block.data)]
+        frames_event = [event_start + d*self.event_inc + offset for d in range(count) for offset in self.event_offsets]
+        frames = SwireFrames()
+        frames.extendBlock(self.block, count, frames_data, frames_event)
+        return frames
+
+class CtrlPortTextRenderer(object):
+    '''
+    render CP content template by text substitution per dword(original bin2CtrlPort way),
+    for templates parseCtrlPortContent does not recognize
+        "event_num" lines and "Delay of about 2 us" lines take one event number each
+        "reg_addr"/"data" lines take register address 2000.. and data bytes of the dword in order
+    '''
+    def __init__(self, content, dword_bytes):
+        self.lines = []     #[(kind, line)]
+        self.event_inc = 0
+        data_count = 0
+        for line in content:
+            if re.search('event_num', line):
+                kind = 'event'
+                self.event_inc += 1
+            elif re.search('reg_addr', line) and re.search('data', line):
+                kind = 'data'
+                data_count += 1
+            elif re.search('Delay of about 2 us', line):
+                kind = 'delay'
+                self.event_inc += 1
+            else:
+                kind = 'text'
+            self.lines.append((kind, line))
+        if data_count > dword_bytes:
+            raise BellagioError("LnkScriptMod: CP content template takes more than one dword!")
+        self.dword_bytes = dword_bytes
+
+    def render(self, event_start, chunk_data):
+        '''
+        same interface as CtrlPortChunkRenderer.render
+        '''
+        hex_data = binascii.hexlify(chunk_data).upper()
+        event_num = event_start
+        out = []
+        for d in range(len(chunk_data) / self.dword_bytes):
+            data_count = d * self.dword_bytes
+            reg_addr = 2000
+            for (kind, line) in self.lines:
+                if kind == 'event':
+                    out.append(line.replace("event_num", str(event_num)))
+                    event_num += 1
+                elif kind == 'data':
+                    out.append(line.replace("reg_addr", str(reg_addr)).replace("data", hex_data[data_count*2:data_count*2+2]))
+                    data_count += 1
+                    reg_addr += 1
+                else:
+                    if kind == 'delay':
+                        event_num += 1
+                    out.append(line)
+        return ''.join(out)
+
+#renderer of CP render worker process
+cp_chunk_renderer = None
+
+def initCtrlPortWorker(renderer_class, renderer_args):
+    global cp_chunk_renderer
+    cp_chunk_renderer = renderer_class(*renderer_args)
+
+def renderCtrlPortChunk(event_start, chunk_txt, part_name):
+    '''
+    render chunk of hex txt into part file, parent process only copies parts to CP script
+    return size of chunk text on disk
+    '''
+    text = cp_chunk_renderer.render(event_start, binascii.unhexlify(chunk_txt))
+    with open(part_name, 'wb') as part_out:
+        part_out.write(text)
+    return textDiskSize(text)
+
+def textDiskSize(text):
+    '''
+    size of text written in text mode("\n" is os.linesep on disk)
+    '''
+    return len(text) + text.count('\n') * (len(os.linesep) - 1)
+
 class LnkScriptMod(object):
     '''
     Singleton class to manipulate LnK script xml file
@@ -168,6 +305,11 @@ class LnkScriptMod(object):
         self.cp_dl_sys_file = r'CP_DL_' + os.path.splitext(self.sys_file)[0] + r'.xml'
         self.cp_dl_fw_file = r'CP_DL_' + os.path.splitext(self.fw_file)[0] + r'.xml'
 
+        #download path planning: DP bus model and plan summary file
+        self.dp_dl_interval = 512           #bits per DP sample(one dword), used if DP template has no Interval
+        self.dp_dl_setup_frames = None      #frames before DP stream, None: same as CP header
+        self.fw_dl_plan_file = r'FW_DL_plan.txt'
+
         '''
         ##############################################################
             swire route
@@ -190,6 +332,8 @@ class LnkScriptMod(object):
         self.swire_cols = 2
         self.input_pcm = 1
         self.swire_framerate = 48
+        self.stream_duration = 1500  #ms: target data stream transfer time
+        self.stream_stimulus = None  #None: LnK built-in sine/pdm_sine; else SwireStimulus.genStimulus params(dict, or list of dict per channel)
 
         '''
         ##############################################################
@@ -197,9 +341,18 @@ class LnkScriptMod(object):
         ##############################################################
         '''
         self.output_path = r'c:\work\soundwire\autotest\\'
-        self.tmp_txt = r"tmp.txt"
+        self.template_cache = {}    #{template file : (mtime, lines)}
         self.char_size = 2  #size of one ascii "char"
         self.dword_size = self.char_size*4  #size of one ascii "dword"(CP send a DWORD every time)
+        self.cp_chunk_dwords = 4096         #dwords per CP script IR chunk
+        self.cp_workers = 1                 #processes rendering CP script chunks, 1: serial, 0: one per CPU(caller needs "__main__" guard on windows)
+        self.cp_incremental = False         #keep chunk index of CP script and only re-render changed chunks next time
+        self.cp_index_suffix = r'.idx'      #CP script chunk index sidecar: <cp script>.idx
+        self.cp_index_version = 2
+        self.sweep_exact_max = 12           #route sweeps up to this size are ordered exactly
+        self.validate_scripts = False       #run LnkScriptValidator on generated scripts
+        self.output_compression = None      #None, 'gz' or 'xz': compress outputs(file name gets ".gz"/".xz" suffix)
+        self.script_format = 'xml'          #'xml', 'csv' or 'bin'(swire_frames.frame_serializers): format of route and CP scripts
 
         tblog.infoLog("LnkScriptMod initialization: {0} {1}" .format(self.sys_txt_file, self.fw_txt_file))
 
@@ -212,6 +365,22 @@ class LnkScriptMod(object):
             cls._instance = LnkScriptMod()
         return cls._instance
 
+    def validateScript(self, script_file, shape=None):
+        '''
+        final structural check of generated script, only if validate_scripts is set
+            shape: (rows, cols) of bus at script start, None for reset shape
+        '''
+        if not self.validate_scripts:
+            return
+        script_file = outputName(script_file, self.output_compression)
+        from bellagio.SystemLib.LnK.lnk_validator import LnkScriptValidator     #validator imports swire LUT from this module
+        validator = LnkScriptValidator()
+        errors = validator.validate(script_file, shape)
+        if errors:
+            for (line_no, msg) in errors:
+                tblog.infoLog("{0}:{1}: {2}" .format(script_file, line_no, msg))
+            raise BellagioError("LnkScriptMod: {0} errors in generated script {1}!" .format(validator.error_count, script_file))
+
     def updateDirFile(self, sys_name, fw_name, output_dir, sys_xml, fw_xml, cp_header, cp_content):
         '''
         update default file/dir name
@@ -244,6 +413,20 @@ class LnkScriptMod(object):
         if cp_content:
             self.cp_content_file = cp_content 
 
+    def readTemplate(self, template):
+        '''
+        read script template lines
+            parsed lines are kept in memory until the template file changes
+        '''
+        mtime = os.path.getmtime(template)
+        cached = self.template_cache.get(template)
+        if not cached or cached[0] != mtime:
+            with open(template) as infile:
+                cached = (mtime, infile.readlines())
+            infile.close()
+            self.template_cache[template] = cached
+        return cached[1]
+
     '''
     ##############################################################
        Gen swire DP download script
@@ -277,50 +460,51 @@ class LnkScriptMod(object):
         '''
         self.bin2Dat()
 
+        #DP data files may be compressed by Bin2Lnk: refer to the file which exists
+        txt_compression = Bin2Lnk.getInstance().output_compression
+
         ###replace sys_config txt in DP download script template
-        with open(self.output_path + self.sys_xml_template_file) as infile, open(self.output_path+self.sys_xml_file, 'w') as outfile:
-            for line in infile:
+        with atomicOutput(self.output_path+self.sys_xml_file, compression=self.output_compression) as outfile:
+            for line in self.readTemplate(self.output_path + self.sys_xml_template_file):
                 if re.search(self.sys_txt_replace, line):
                     #update DP DL txt file
-                    line = line.replace(self.sys_txt_replace, self.output_path+self.sys_txt_file)
+                    line = line.replace(self.sys_txt_replace, outputName(self.output_path+self.sys_txt_file, txt_compression))
                 elif re.search('_DATE_', line):
                     #update date
                     line = line.replace("_DATE_", datetime.datetime.now().strftime("%m/%d/%Y"))
                 outfile.write(line)
 
-        infile.close()
-        outfile.close()
-
         ###replace bosko_fw txt in DP download script template
         if not os.path.isfile(self.output_path + self.fw_xml_template_file):
             raise BellagioError("Could not find LnK script xml file for bosko fw!")
 
-        with open(self.output_path + self.fw_xml_template_file) as infile, open(self.output_path+self.fw_xml_file, 'w') as outfile:
-            for line in infile:
+        with atomicOutput(self.output_path+self.fw_xml_file, compression=self.output_compression) as outfile:
+            for line in self.readTemplate(self.output_path + self.fw_xml_template_file):
                 if re.search(self.fw_txt_replace, line):
                     #update DP DL txt file
-                    line = line.replace(self.fw_txt_replace, self.output_path+self.fw_txt_file)
+                    line = line.replace(self.fw_txt_replace, outputName(self.output_path+self.fw_txt_file, txt_compression))
                 elif re.search('_DATE_', line):
                     #update date
                     line = line.replace("_DATE_", datetime.datetime.now().strftime("%m/%d/%Y"))
                 outfile.write(line)
 
-        infile.close()
-        outfile.close()
-
+        self.validateScript(self.output_path+self.sys_xml_file)
+        self.validateScript(self.output_path+self.fw_xml_file)
         tblog.infoLog("LnkScriptMod: LnK script xml file revised!")
-        return self.sys_xml_file, self.fw_xml_file
+        return outputName(self.sys_xml_file, self.output_compression), outputName(self.fw_xml_file, self.output_compression)
 
     '''
     ##############################################################
        Gen swire CP download script
     ##############################################################
     '''
-    def bin2CtrlPort(self, bin_file, cp_dl_script):
+    def bin2CtrlPort(self, bin_file, cp_dl_script, progress=None, cancel=None):
         '''
         convert config/fw binary file to LnK data control port script file
             bin_file: binary_file name(config or FW)
             cp_dl_script: output CP DL script file name
+            progress: callback(done_bytes, total_bytes, dwords_per_sec, eta_sec)
+            cancel: lnk_progress.CancelToken, checked once per cp_chunk_dwords
         '''
         if not os.path.isfile(self.output_path + self.cp_header_file):
             tblog.infoLog("LnkScriptMod: failed to find CP header script!")
@@ -334,14 +518,27 @@ class LnkScriptMod(object):
         ###convert binary to txt and align to 4-byte
         '''
         bin2lnk = Bin2Lnk()
-        bin2lnk.bin2txt(bin_file, self.tmp_txt)
+        txt = bin2lnk.readImage(bin_file)
+        report = LnkProgress("bin2CtrlPort", len(txt) / self.char_size, progress, cancel)
+        digests = self.calChunkDigests(txt) if self.cp_incremental and self.script_format == 'xml' else None
+        index_file = cp_dl_script + self.cp_index_suffix
+        if not digests and os.path.isfile(index_file):
+            #script is rewritten without index: old index must not be used to splice it later
+            os.remove(index_file)
+            tblog.infoLog("LnkScriptMod: removed CP index {0}" .format(index_file))
+        chunk_sizes = [] if digests else None
 
         '''
         ###generate CP DL script from header, content and input data
         '''
-        with open(self.output_path + self.cp_header_file) as cp_header, open(cp_dl_script, 'w') as cp_dl_out, open(self.tmp_txt) as input_data:
+        content = self.readTemplate(self.output_path + self.cp_content_file)
+        serializer = frame_serializers[self.script_format]()
+        with atomicOutput(cp_dl_script, serializer.file_mode, self.output_compression) as script_out:
+            #csv/bin: whole script is collected as IR and serialized at the end
+            cp_dl_out = script_out if self.script_format == 'xml' else SwireFrames()
             event_str = "0"
-            for header_line in cp_header:
+            header_size = 0
+            for header_line in self.readTemplate(self.output_path + self.cp_header_file):
                 '''
                 ###write header file to output till last line
                 '''
@@ -360,67 +557,320 @@ class LnkScriptMod(object):
                         header_line = header_line.replace("_DATE_", datetime.datetime.now().strftime("%m/%d/%Y"))
                     #tblog.infoLog("{0}" .format(header_line))
                     cp_dl_out.write(header_line)
+                    if txt:
+                        header_size += self.diskSize(header_line)
                 else:
                     '''
-                    ###loop input data into content script and insert
+                    ###loop input data into content script and insert(only once, before "<Command>")
                     '''
-                    event_num = int(event_str) + 2              #Event # LHDEBUG...original # start from "+2"
-                    tblog.infoLog("start event number in int: {0}" .format(event_num))
-
-                    dword = input_data.read(self.dword_size)
-                    #tblog.infoLog("dword read: {0}" .format(dword))
-
-                    while dword != "":
-                        '''
-                        ###reset data count and addr
-                        '''
-                        data_count = 0
-                        reg_addr = 2000
-                        l = list(dword)
-
-                        with open(self.output_path + self.cp_content_file) as cp_content:
-                            for line in cp_content:
-                                if re.search('event_num', line):
-                                    '''
-                                    ###update event
-                                    '''
-                                    new_line = line.replace("event_num", str(event_num))
-                                    event_num += 1
-                                elif re.search('reg_addr', line) and re.search('data', line):
-                                    '''
-                                    ###update register address and data
-                                    '''
-                                    new_line1 = line.replace("reg_addr", str(reg_addr))
-                                    new_line = new_line1.replace("data", l[data_count*2] + l[data_count*2+1])
-                                    #tblog.infoLog("reg_addr: {0} data: {1}" .format(reg_addr, l[data_count*2] + l[data_count*2+1]))
-                                    data_count += 1
-                                    reg_addr += 1
-                                else:
-                                    '''
-                                    ###do nothing
-                                    '''
-                                    if re.search('Delay of about 2 us', line):
-                                        ###add one frame delay?
-                                        event_num += 1
-                                    new_line = line
-                                cp_dl_out.write(new_line)
-                        cp_content.close()
-
-                        '''
-                        ###loop data file
-                        '''
-                        dword = input_data.read(self.dword_size)
-                        #tblog.infoLog("dword read: {0}" .format(dword))
-                        #break   ###debug...
+                    if txt:
+                        event_num = int(event_str) + 2              #Event # LHDEBUG...original # start from "+2"
+                        tblog.infoLog("start event number in int: {0}" .format(event_num))
+                        splice = None
+                        if digests:
+                            splice = self.loadCtrlPortIndex(cp_dl_script, content, event_num, digests)
+                        try:
+                            self.renderCtrlPortContent(cp_dl_out, content, txt, event_num, report, splice, chunk_sizes)
+                        finally:
+                            if splice:
+                                splice[0].close()
+                        txt = ""
                     ###write "<Command>" line
                     cp_dl_out.write(header_line)
+            if cp_dl_out is not script_out:
+                serializer.write(cp_dl_out, script_out)
 
-        cp_header.close()
-        cp_dl_out.close()
-        input_data.close()
-        os.remove(self.tmp_txt)
+        if digests:
+            self.saveCtrlPortIndex(cp_dl_script, content, event_num, digests, header_size, chunk_sizes)
+        if self.script_format == 'xml':
+            self.validateScript(cp_dl_script)
         tblog.infoLog("LnkScriptMod: converted bin to control port script file{0}!" .format(cp_dl_script))
 
+    def parseCtrlPortContent(self, content):
+        '''
+        parse CP content template into IR records of one dword block
+            "event_num" lines and "Delay of about 2 us" comments take one event number each
+            "0xreg_addr"/"0xdata" write frames take register address 0x2000.. and data bytes of the dword in order
+            frame lines must be in standard format(as written by LnkXmlSerializer), so the script is byte-identical
+            raise BellagioError for templates which do not fit(e.g. CRLF, tabs), renderCtrlPortContent then uses CtrlPortTextRenderer
+        return (records, event number increment per dword)
+            record: [kind, flags, repeat, rows, cols, opcode, ssp, dev, addr, data, event offset, note, data byte index(-1: fixed)]
+        '''
+        records = []
+        frame = None
+        event_count = 0
+        event_start = None
+        data_count = 0
+        for line in content:
+            if frame is None:
+                if line == '<!-- Event #event_num : Frame Start -->\n':
+                    event_start = event_count
+                    event_count += 1
+                    continue
+                found = re.match('<Swframe Repeat="(\d+)" rows="(\d+)" cols="(\d+)" preq="0" StaticSync="177" Phy="0" DynamicSync="Valid" Parity="Valid" nak="0" ack="0" >\n$', line)
+                if found:
+                    frame = [swire_frames.FRAME_PING, 0, int(found.group(1)), int(found.group(2)), int(found.group(3)), 0, 0, 0, 0, 0, 0, '', -1]
+                    cw_found = False
+                    if event_start is not None:
+                        frame[1] |= swire_frames.FLAG_EVENT
+                        frame[10] = event_start
+                        event_start = None
+                    continue
+                if line == ' \n' and records and records[-1][0] != swire_frames.TEXT and not records[-1][1] & swire_frames.FLAG_GAP:
+                    records[-1][1] |= swire_frames.FLAG_GAP
+                    continue
+                if re.search('event_num|reg_addr|controlword|Swframe', line) or event_start is not None:
+                    raise BellagioError("LnkScriptMod: unsupported CP content line: {0}" .format(line))
+                if re.search('Delay of about 2 us', line):
+                    event_count += 1
+                records.append([swire_frames.TEXT, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, line, -1])
+                continue
+
+            '''
+            ###inside frame
+            '''
+            if line == '</Swframe>\n' and cw_found:
+                records.append(frame)
+                frame = None
+                continue
+            found = re.match('   <!-- Event #event_num : (\w+) -->\n$', line)
+            if found and not cw_found and frame[1] & swire_frames.FLAG_EVENT and event_count == frame[10] + 1:
+                event_count += 1
+                continue
+            found_ping = re.match('   <controlword opcode="0" ssp="(\d+)" breq="0" brel="0" reserved="0" />\n$', line)
+            found_rw = re.match('   <controlword opcode="([23])" DeviceAddress="(\d+)" RegisterAddress="0x(\w+)" Data="0x(\w+)" />\n$', line)
+            if found_ping and not cw_found:
+                frame[6] = int(found_ping.group(1))
+                cw_found = True
+            elif found_rw and not cw_found:
+                cw_found = True
+                frame[0] = swire_frames.FRAME_RW
+                frame[5] = int(found_rw.group(1))
+                frame[7] = int(found_rw.group(2))
+                if found_rw.group(3) == 'reg_addr' and found_rw.group(4) == 'data':
+                    #register address keeps original "0x" + str(2000 + n) form
+                    frame[8] = int(str(2000 + data_count), 16)
+                    frame[1] |= swire_frames.FLAG_UPPER
+                    frame[12] = data_count
+                    data_count += 1
+                elif "0x{0:04x}" .format(int(found_rw.group(3), 16)) == "0x" + found_rw.group(3) and "0x{0:02x}" .format(int(found_rw.group(4), 16)) == "0x" + found_rw.group(4):
+                    frame[8] = int(found_rw.group(3), 16)
+                    frame[9] = int(found_rw.group(4), 16)
+                else:
+                    raise BellagioError("LnkScriptMod: unsupported CP content line: {0}" .format(line))
+            elif not cw_found or re.search('controlword|event_num|Swframe', line):
+                raise BellagioError("LnkScriptMod: unsupported CP content line: {0}" .format(line))
+            else:
+                #text after control word, e.g. comment
+                if re.search('Delay of about 2 us', line):
+                    event_count += 1
+                frame[11] += line
+
+        if frame is not None or event_start is not None or data_count*self.char_size != self.dword_size:
+            raise BellagioError("LnkScriptMod: CP content template must take one dword in complete frames!")
+        return records, event_count
+
+    def renderCtrlPortContent(self, cp_dl_out, content, txt, event_num, report=None, splice=None, chunk_sizes=None):
+        '''
+        write CP content template once per dword of input txt
+            cp_dl_out: output file, or SwireFrames to get IR of content(rendered serially)
+            content: CP content template lines
+            txt: input data, 8 hex chars per dword
+            event_num: event number of first dword
+            report: LnkProgress, updated per chunk
+            splice: (previous script file, chunk offsets, changed chunks), unchanged chunks are copied from previous script
+            chunk_sizes: list to get output size of each chunk of cp_chunk_dwords, None if not needed
+        return next event number
+        '''
+        dword_bytes = self.dword_size / self.char_size
+        try:
+            (records, event_inc) = self.parseCtrlPortContent(content)
+            (renderer_class, renderer_args) = (CtrlPortChunkRenderer, (records, event_inc, dword_bytes))
+        except BellagioError as e:
+            tblog.infoLog("{0} CP content is rendered by text substitution" .format(e))
+            (renderer_class, renderer_args) = (CtrlPortTextRenderer, (content, dword_bytes))
+        renderer = renderer_class(*renderer_args)
+        event_inc = renderer.event_inc
+        to_frames = isinstance(cp_dl_out, SwireFrames)
+        if to_frames and renderer_class is not CtrlPortChunkRenderer:
+            raise BellagioError("LnkScriptMod: CP content template not in standard format can only be written as xml!")
+
+        dwords = len(txt) / self.dword_size
+        chunks = range(0, dwords, self.cp_chunk_dwords)
+        if to_frames:
+            workers = 1
+        elif splice:
+            workers = min(self.calCtrlPortWorkers(), len(splice[2]))
+        else:
+            workers = min(self.calCtrlPortWorkers(), len(chunks))
+
+        '''
+        ###chunk start event is known up front: chunks render on worker processes, and are written in order
+           workers get hex txt of their chunk and write rendered text to part files, parent only copies parts to output
+           at most 2 chunks per worker are in flight, so memory and part files stay bounded when output is slower than rendering
+        '''
+        pool = None
+        part_dir = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initCtrlPortWorker, (renderer_class, renderer_args))
+            part_dir = tempfile.mkdtemp(prefix='lnk_cp_')
+            tblog.infoLog("LnkScriptMod: rendering CP script on {0} processes" .format(workers))
+        try:
+            pending = collections.deque()
+            for start in chunks:
+                stop = min(start + self.cp_chunk_dwords, dwords)
+                chunk = start / self.cp_chunk_dwords
+                chunk_txt = txt[start*self.dword_size:stop*self.dword_size]
+                part = None
+                if splice and chunk not in splice[2]:
+                    text = None
+                elif pool:
+                    part = os.path.join(part_dir, "{0}.part" .format(chunk))
+                    text = pool.apply_async(renderCtrlPortChunk, (event_num + start*event_inc, chunk_txt, part)).get
+                else:
+                    text = functools.partial(renderer.frames if to_frames else renderer.render, event_num + start*event_inc, binascii.unhexlify(chunk_txt))
+                pending.append((start, chunk, text, part))
+                while len(pending) > 2*workers:
+                    self.writeCtrlPortChunk(cp_dl_out, dword_bytes, report, splice, chunk_sizes, *pending.popleft())
+            while pending:
+                self.writeCtrlPortChunk(cp_dl_out, dword_bytes, report, splice, chunk_sizes, *pending.popleft())
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+                shutil.rmtree(part_dir, True)
+        if report:
+            report.update(dwords*dword_bytes)
+        return event_num + dwords*event_inc
+
+    def calCtrlPortWorkers(self):
+        '''
+        number of CP render processes
+        '''
+        if self.cp_workers:
+            return self.cp_workers
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+
+    def writeCtrlPortChunk(self, cp_dl_out, dword_bytes, report, splice, chunk_sizes, start, chunk, text, part=None):
+        '''
+        write one chunk of CP content
+            text: function returning rendered chunk(text or IR), None to copy chunk from previous script
+            part: part file of chunk rendered by worker, text returns its size on disk
+        '''
+        if report:
+            report.update(start*dword_bytes)
+        if text is None:
+            text = self.readPrevChunk(splice[0], splice[1][chunk], splice[1][chunk+1])
+            cp_dl_out.write(text)
+            if chunk_sizes is not None:
+                chunk_sizes.append(splice[1][chunk+1] - splice[1][chunk])
+            return
+        if part:
+            size = text()
+            with open(part, 'rb') as part_in:
+                for block in iter(functools.partial(part_in.read, OutputSink.block_size), ''):
+                    cp_dl_out.write(block)
+            os.remove(part)
+            if chunk_sizes is not None:
+                chunk_sizes.append(size)
+            return
+        text = text()
+        if isinstance(text, SwireFrames):
+            cp_dl_out.extend(text)
+            return
+        cp_dl_out.write(text)
+        if chunk_sizes is not None:
+            chunk_sizes.append(self.diskSize(text))
+
+    '''
+    ##############################################################
+       incremental CP script: chunk index
+    ##############################################################
+    '''
+    def diskSize(self, text):
+        return textDiskSize(text)
+
+    def readPrevChunk(self, prev_script, start, stop):
+        '''
+        read bytes [start, stop) of previous script as text
+        '''
+        prev_script.seek(start)
+        text = prev_script.read(stop - start)
+        if len(text) != stop - start:
+            raise BellagioError("LnkScriptMod: previous CP script is shorter than its index!")
+        if os.linesep != '\n':
+            text = text.replace(os.linesep, '\n')
+        return text
+
+    def calChunkDigests(self, txt):
+        '''
+        digest of input txt per cp_chunk_dwords
+        '''
+        chunk = self.cp_chunk_dwords * self.dword_size
+        return [hashlib.md5(txt[i:i+chunk]).hexdigest() for i in range(0, len(txt), chunk)]
+
+    def indexKey(self, content, event_num):
+        '''
+        everything besides input data that changes CP content: template, start event number, chunk size
+        '''
+        key = hashlib.md5(''.join(content))
+        key.update("{0} {1} {2} {3}" .format(self.cp_index_version, event_num, self.cp_chunk_dwords, self.dword_size))
+        return key.hexdigest()
+
+    def loadCtrlPortIndex(self, cp_dl_script, content, event_num, digests):
+        '''
+        compare chunk digests with index of previous CP script
+        return (previous script file, chunk offsets, changed chunks) or None if previous script can not be reused
+        '''
+        index_file = cp_dl_script + self.cp_index_suffix
+        if not os.path.isfile(index_file):
+            return None
+        try:
+            with open(index_file) as index_in:
+                index = json.load(index_in)
+            index_in.close()
+        except ValueError:
+            tblog.infoLog("LnkScriptMod: CP index {0} corrupted, full render" .format(index_file))
+            return None
+
+        prev_script = index.get('script')
+        if (index.get('version') != self.cp_index_version or index.get('key') != self.indexKey(content, event_num)
+                or not os.path.isfile(prev_script) or os.path.getsize(prev_script) != index.get('script_size')
+                or os.path.getmtime(prev_script) != index.get('script_mtime')):
+            tblog.infoLog("LnkScriptMod: CP index {0} out of date, full render" .format(index_file))
+            return None
+
+        prev_digests = index['digests']
+        changed = set([i for (i, digest) in enumerate(digests) if i >= len(prev_digests) or digest != prev_digests[i]])
+        if len(changed) == len(digests):
+            return None
+        offsets = [index['header_size']]
+        for size in index['chunk_sizes']:
+            offsets.append(offsets[-1] + size)
+        tblog.infoLog("LnkScriptMod: incremental CP script, {0} of {1} chunks changed" .format(len(changed), len(digests)))
+        return openInput(prev_script), offsets, changed
+
+    def saveCtrlPortIndex(self, cp_dl_script, content, event_num, digests, header_size, chunk_sizes):
+        '''
+        write chunk index of new CP script
+        '''
+        script = outputName(cp_dl_script, self.output_compression)
+        index = {
+            'version'       : self.cp_index_version,
+            'key'           : self.indexKey(content, event_num),
+            'script'        : script,
+            'script_size'   : os.path.getsize(script),
+            'script_mtime'  : os.path.getmtime(script),     #script rewritten by anything else is not spliced
+            'header_size'   : header_size,
+            'chunk_sizes'   : chunk_sizes,
+            'digests'       : digests,
+            }
+        with atomicOutput(cp_dl_script + self.cp_index_suffix) as index_out:
+            json.dump(index, index_out)
+
     def genCtrlPortScript(self):
         if not os.path.isfile(self.output_path + self.sys_file):
             raise BellagioError("Could not find sys config bin!")
@@ -430,7 +880,120 @@ class LnkScriptMod(object):
             raise BellagioError("Could not find Bosko FW bin!")
         self.bin2CtrlPort(self.output_path+self.fw_file, self.output_path+self.cp_dl_fw_file)
         
-        return self.cp_dl_sys_file, self.cp_dl_fw_file
+        return outputName(self.cp_dl_sys_file, self.output_compression), outputName(self.cp_dl_fw_file, self.output_compression)
+
+    '''
+    ##############################################################
+       Plan swire FW download: DP or CP
+    ##############################################################
+    '''
+    def calScriptFrames(self, script_file):
+        '''
+        scan LnK script for frames
+        return (frames, bits) of all "Swframe" in script
+        '''
+        frames = 0
+        bits = 0
+        with open(script_file) as script:
+            for line in script:
+                found = re.search('<Swframe Repeat="(\d+)" rows="(\d+)" cols="(\d+)"', line)
+                if found:
+                    repeat = int(found.group(1))
+                    frames += repeat
+                    bits += repeat * int(found.group(2)) * int(found.group(3))
+        script.close()
+        return frames, bits
+
+    def calDwords(self, bin_file):
+        '''
+        number of dwords(4-byte aligned) to download for a binary
+        '''
+        if not os.path.isfile(bin_file):
+            raise BellagioError("Could not find binary {0}!" .format(bin_file))
+        return (os.path.getsize(bin_file) + 3) / 4
+
+    def planFwDownload(self, method=None):
+        '''
+        estimate bus time of sys config + FW download over CP and DP and pick the faster one
+            CP: header frames + per-dword frames of CP content template(4 writes and 1 ping by default)
+            DP: setup frames + (header + data) dwords, one dword per DP sample interval
+            method: 'cp' or 'dp' to override the choice
+        return plan dict
+        '''
+        if method not in (None, 'cp', 'dp'):
+            raise BellagioError("Unknown FW download method {0}!" .format(method))
+
+        for f in (self.cp_header_file, self.cp_content_file):
+            if not os.path.isfile(self.output_path + f):
+                raise BellagioError("LnkScriptMod: failed to find CP script {0}!" .format(f))
+
+        dwords = self.calDwords(self.output_path + self.sys_file) + self.calDwords(self.output_path + self.fw_file)
+        bitrate = float(self.swire_bitrate)    #bits per ms
+
+        '''
+        CP path: scripts are run one per binary, each with its own header
+        '''
+        (cp_header_frames, cp_header_bits) = self.calScriptFrames(self.output_path + self.cp_header_file)
+        (cp_dword_frames, cp_dword_bits) = self.calScriptFrames(self.output_path + self.cp_content_file)
+        cp_time = (2 * cp_header_bits + dwords * cp_dword_bits) / bitrate
+
+        '''
+        DP path: interval from DP template if defined there
+        '''
+        dp_interval = self.dp_dl_interval
+        for f in (self.sys_xml_template_file, self.fw_xml_template_file):
+            if os.path.isfile(self.output_path + f):
+                with open(self.output_path + f) as dp_template:
+                    for line in dp_template:
+                        found = re.search('Interval="(\d+)"', line)
+                        if found:
+                            dp_interval = int(found.group(1))
+                            break
+                dp_template.close()
+                break
+        dp_header_dwords = 0
+        if Bin2Lnk().version < 103:
+            dp_header_dwords = 2     #8-byte 00 header per binary
+        if self.dp_dl_setup_frames is None:
+            dp_setup_bits = cp_header_bits
+        else:
+            dp_setup_bits = self.dp_dl_setup_frames * self.swire_rows * self.swire_cols
+        dp_time = (2 * dp_setup_bits + (dwords + 2 * dp_header_dwords) * dp_interval) / bitrate
+
+        plan = {
+            'dwords'            : dwords,
+            'bitrate_khz'       : self.swire_bitrate,
+            'cp_frames_per_dword' : cp_dword_frames,
+            'cp_time_ms'        : cp_time,
+            'dp_interval_bits'  : dp_interval,
+            'dp_time_ms'        : dp_time,
+            'method'            : method if method else ('dp' if dp_time < cp_time else 'cp'),
+            'override'          : method is not None,
+            }
+        tblog.infoLog("FW download plan: CP {0:.1f} ms DP {1:.1f} ms -> {2}" .format(cp_time, dp_time, plan['method']))
+        return plan
+
+    def genFwDownloadScript(self, method=None):
+        '''
+        generate FW download script of the faster path(or "method" if given) only
+        plan summary is written to self.fw_dl_plan_file
+        return (sys script, fw script)
+        '''
+        plan = self.planFwDownload(method)
+        if plan['method'] == 'dp':
+            scripts = self.modDataPortScript()
+        else:
+            scripts = self.genCtrlPortScript()
+
+        with atomicOutput(self.output_path + self.fw_dl_plan_file) as plan_out:
+            plan_out.write("date: {0}\n" .format(datetime.datetime.now().strftime("%m/%d/%Y %H:%M:%S")))
+            plan_out.write("sys: {0}\nfw: {1}\n" .format(self.sys_file, self.fw_file))
+            for k in sorted(plan.keys()):
+                plan_out.write("{0}: {1}\n" .format(k, plan[k]))
+            plan_out.write("estimated_time_ms: {0:.3f}\n" .format(plan[plan['method'] + '_time_ms']))
+            plan_out.write("scripts: {0} {1}\n" .format(scripts[0], scripts[1]))
+
+        return scripts
 
     '''
     ##############################################################
@@ -443,111 +1006,105 @@ class LnkScriptMod(object):
         '''
         return delay_time * self.swire_framerate
 
-    def genSwirePing(self, out_file, delay=1, ssp=0, rows=48, cols=2):
+    def calShapiroDelay(self, framerate, rows, cols):
+        '''
+        frames of Shapiro write/read delay at frame shape rows x cols
+            full route script sends calTimeInFrames(10) frames(route frame rate) at reset shape 48x2,
+            route transition keeps the same bus time at the frame shape of the bus
+        '''
+        bits = 10 * framerate * 48 * 2
+        return (bits + rows*cols - 1) / (rows*cols)
+
+    def genSwirePing(self, frames, delay=1, ssp=0, rows=48, cols=2):
         '''
         Generate SWIRE Ping script
         delay: "ping" is also used for delay: use "calTimeInFrames" to calculate how many frames a delay needs
         ssp: usually "ssp" only needs to be enabled in data stream transfer portion
         '''
-        line_ping = r'<Swframe Repeat="_DELAY_" rows="_ROWS_" cols="_COLS_" preq="0" StaticSync="177" Phy="0" DynamicSync="Valid" Parity="Valid" nak="0" ack="0" >' + '\n' + r'   <controlword opcode="0" ssp="_SSP_" breq="0" brel="0" reserved="0" />' + '\n' + '</Swframe>\n'
-        line_ping = line_ping.replace("_DELAY_", str(delay))
-        line_ping = line_ping.replace("_SSP_", str(ssp))
-        line_ping = line_ping.replace("_ROWS_", str(rows))
-        line_ping = line_ping.replace("_COLS_", str(cols))
-        out_file.write(line_ping)
+        frames.addPing(delay, ssp, rows, cols)
 
-    def writeReadSwireReg(self, out_file, write, addr, val, dev=1, rows=48, cols=2):
+    def writeReadSwireReg(self, frames, write, addr, val, dev=1, rows=48, cols=2):
         '''
         generate script to write/read swire reg
         '''
-        line_frame_start = r'<Swframe Repeat="1" rows="_ROWS_" cols="_COLS_" preq="0" StaticSync="177" Phy="0" DynamicSync="Valid" Parity="Valid" nak="0" ack="0" >' + '\n'
-        line_frame_end = r'</Swframe>' + '\n'
-        line_frame = r'   <controlword opcode="_WR_RD_" DeviceAddress="_DEV_" RegisterAddress="_swire_reg_" Data="_swire_val_" />' + '\n'
+        frames.addRw(write, dev, addr, val, rows, cols)
 
-        line_frame_start = line_frame_start.replace("_ROWS_", str(rows))
-        line_frame_start = line_frame_start.replace("_COLS_", str(cols))
-        out_file.write(line_frame_start)
-
-        line_frame = line_frame.replace("_swire_reg_", ("0x{0:04x}" .format(addr)))
-        line_frame = line_frame.replace("_swire_val_", ("0x{0:02x}" .format(val&0xff)))
-        line_frame = line_frame.replace("_DEV_", str(dev))
-        if write:
-            line_frame = line_frame.replace("_WR_RD_", str(3))
-        else:   #read
-            line_frame = line_frame.replace("_WR_RD_", str(2))
-        out_file.write(line_frame)
-
-        out_file.write(line_frame_end)
-
-    def writeShapiroReg(self, out_file, addr, val, dev=1, rows=48, cols=2):
+    def writeShapiroReg(self, frames, addr, val, dev=1, rows=48, cols=2, delay=None):
         '''
         generate script to write Shapiro reg through swire
+            delay: frames of each delay, default is calTimeInFrames(10)
         '''
+        if delay is None:
+            delay = self.calTimeInFrames(10)
         line_comment = '<!-- Shapiro write reg 0x{0:X} = 0x{1:04x} -->\n' .format(addr, val)
 
-        out_file.write(line_comment)
+        frames.write(line_comment)
 
         write = 1
         swire_reg = 0x2000
-        self.writeReadSwireReg(out_file, write, swire_reg, val&0xff, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, val&0xff, dev, rows, cols)
 
         swire_reg += 1  #0x2001
-        self.writeReadSwireReg(out_file, write, swire_reg, (val>>8)&0xff, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, (val>>8)&0xff, dev, rows, cols)
 
         swire_reg += 1  #0x2002
-        self.writeReadSwireReg(out_file, write, swire_reg, addr&0xff, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, addr&0xff, dev, rows, cols)
 
         swire_reg += 1  #0x2003
-        self.writeReadSwireReg(out_file, write, swire_reg, (addr>>8)&0xff, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, (addr>>8)&0xff, dev, rows, cols)
 
         ###Add 10ms delay between shapiro write/read
-        self.genSwirePing(out_file, self.calTimeInFrames(10), 0, rows, cols)
+        self.genSwirePing(frames, delay, 0, rows, cols)
 
         write = 0
         swire_reg += 1
-        self.writeReadSwireReg(out_file, write, swire_reg, 0, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, 0, dev, rows, cols)
 
         swire_reg += 1
-        self.writeReadSwireReg(out_file, write, swire_reg, 0, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, 0, dev, rows, cols)
 
         swire_reg += 1
-        self.writeReadSwireReg(out_file, write, swire_reg, 0, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, 0, dev, rows, cols)
 
         swire_reg += 1
-        self.writeReadSwireReg(out_file, write, swire_reg, 0, dev, rows, cols)
+        self.writeReadSwireReg(frames, write, swire_reg, 0, dev, rows, cols)
 
         ###Add 10ms delay between shapiro write/read
-        self.genSwirePing(out_file, self.calTimeInFrames(10), 0, rows, cols)
+        self.genSwirePing(frames, delay, 0, rows, cols)
 
-    def genShapiroRouteSetting(self, out_file, route_num, frame_size):
+    def calShapiroRoutePlan(self, route_num, frame_size):
         '''
-        Generate shapiro route setup script
+        shapiro route setup register writes
+        return list of (addr, val) in write order
         '''
-        tblog.infoLog("Shapiro SWIRE route {0} setup" .format(route_num))
-        self.writeShapiroReg(out_file, 0x8035, frame_size)
-        self.writeShapiroReg(out_file, 0x8030, samplerate_reg_val[self.swire_framerate])
+        plan = [(0x8035, frame_size), (0x8030, samplerate_reg_val[self.swire_framerate])]
         '''
         FIXME: should use command table for each route?
         '''
         if route_num == 10:
-            self.writeShapiroReg(out_file, 0x800c, 0x1002)
-            self.writeShapiroReg(out_file, 0x800d, 0x0003)
+            plan += [(0x800c, 0x1002), (0x800d, 0x0003)]
         if route_num == 19:
-            self.writeShapiroReg(out_file, 0x800c, 0x1002)
-            self.writeShapiroReg(out_file, 0x800d, 0x0004)
-            self.writeShapiroReg(out_file, 0x800c, 0x1202)
-            self.writeShapiroReg(out_file, 0x800d, 0x0004)
-            self.writeShapiroReg(out_file, 0x800c, 0x1302)
-            self.writeShapiroReg(out_file, 0x800d, 0x0004)
+            plan += [(0x800c, 0x1002), (0x800d, 0x0004),
+                     (0x800c, 0x1202), (0x800d, 0x0004),
+                     (0x800c, 0x1302), (0x800d, 0x0004)]
 
-        self.writeShapiroReg(out_file, 0x8032, route_num)
+        plan.append((shapiro_route_start, route_num))
+        return plan
 
-    def genSwireRouteSetting(self, out_file):
+    def genShapiroRouteSetting(self, frames, route_num, frame_size):
         '''
-        Generate SWIRE route setup script
+        Generate shapiro route setup script
+        '''
+        tblog.infoLog("Shapiro SWIRE route {0} setup" .format(route_num))
+        for (addr, val) in self.calShapiroRoutePlan(route_num, frame_size):
+            self.writeShapiroReg(frames, addr, val)
+
+    def calSwireRoutePlan(self):
+        '''
+        SWIRE DP register writes of current route
+        return list of (addr, val) in write order
         '''
-        self.genSwirePing(out_file)
-        i = 0;
+        plan = []
         '''
         Program shapiro registers in sequence
         '''
@@ -558,75 +1115,172 @@ class LnkScriptMod(object):
                         #No swire RX, input from PCM/PDM: just skip
                         break
                     else:
-                        self.writeReadSwireReg(out_file, 1, v[swire_reg_addr], v[swire_reg_val])
+                        plan.append((v[swire_reg_addr], v[swire_reg_val]))
                         break
+        return plan
 
-    def genSwireFrameShapeSetting(self, out_file):
+    def genSwireRouteSetting(self, frames):
         '''
-        Generate SWIRE frame shape setup script
+        Generate SWIRE route setup script
+        '''
+        self.genSwirePing(frames)
+        for (addr, val) in self.calSwireRoutePlan():
+            self.writeReadSwireReg(frames, 1, addr, val)
+
+    def calFrameCtrl(self):
+        '''
+        SCP_FrameCtrl value of current frame shape
         '''
         rows_ctrl = swire_rows_ctrl[self.swire_rows]
         cols_ctrl = swire_cols_ctrl[self.swire_cols]
+        return (rows_ctrl << 3) + cols_ctrl
+
+    def genSwireFrameShapeSetting(self, frames):
+        '''
+        Generate SWIRE frame shape setup script
+        '''
         scp_framectrl_addr = 0x70
-        scp_framectrl_val = (rows_ctrl << 3) + cols_ctrl
+        scp_framectrl_val = self.calFrameCtrl()
         tblog.infoLog("swire frame control: 0x{0:02x}" .format(scp_framectrl_val))
 
-        self.genSwirePing(out_file)
-        self.writeReadSwireReg(out_file, 1, scp_framectrl_addr, scp_framectrl_val, 15)  #dev=15 to broadcast
+        self.genSwirePing(frames)
+        self.writeReadSwireReg(frames, 1, scp_framectrl_addr, scp_framectrl_val, 15)  #dev=15 to broadcast
+
+    def updateOutputCompression(self, compression):
+        '''
+        update output compression of LnkScriptMod and Bin2Lnk
+            compression: None, 'gz' or 'xz'
+            scripts refer to data files(DP download txt, stimulus) by the name written, with ".gz"/".xz" suffix
+        '''
+        outputName('', compression)     #check compression
+        self.output_compression = compression
+        Bin2Lnk.getInstance().output_compression = compression
+        tblog.infoLog("LnkScriptMod: output compression {0}" .format(compression))
+
+    def updateScriptFormat(self, script_format):
+        '''
+        update format of route and CP scripts
+            script_format: 'xml'(LnK script), 'csv' or 'bin'(IR dump for analysis, swire_frames.BinarySerializer reads it back)
+        '''
+        if script_format not in frame_serializers:
+            raise BellagioError("LnkScriptMod: unknown script format {0}!" .format(script_format))
+        self.script_format = script_format
+        tblog.infoLog("LnkScriptMod: script format {0}" .format(script_format))
+
+    def updateStreamStimulus(self, stimulus):
+        '''
+        update data stream stimulus
+            stimulus: None to use LnK built-in sine/pdm_sine
+                      dict of SwireStimulus.genStimulus params, e.g. {'wave' : 'multitone', 'tones' : [(1000, -6), (3000, -12)]}
+                      or list of dict, one per channel
+        '''
+        self.stream_stimulus = stimulus
 
-    def genSwireStream(self, out_file):
+    def genSwireStimulus(self, ch, stim_prefix, duration):
+        '''
+        Generate stimulus file for one channel at rx sample rate and word length
+            random waves(noise) get seed + ch, so channels are not identical
+        return stimulus file name as written(with compression suffix)
+        '''
+        from bellagio.SystemLib.LnK.stimulus import SwireStimulus     #numpy is only needed for custom stimulus
+
+        if isinstance(self.stream_stimulus, dict):
+            params = dict(self.stream_stimulus)
+        else:
+            params = dict(self.stream_stimulus[ch])
+        wave = params.pop('wave', 'sine')
+        seed = params.pop('seed', 0) + ch
+
+        stim_file = stim_prefix + '_ch' + str(ch) + '.txt'
+        SwireStimulus.getInstance().genStimulus(stim_file, wave, self.rx_samplerate, self.rx_wordlength+1, duration, not self.input_pcm, seed, self.output_compression, **params)
+        return outputName(stim_file, self.output_compression)
+
+    def genSwireStream(self, frames, duration=None, stim_prefix=None):
         '''
         Generate SWIRE data stream definition script
+            duration: stream time(ms) to cover with custom stimulus, default is self.stream_duration
+            stim_prefix: custom stimulus file name prefix
         '''
         line_stream = r'   <DataStream Id="A1">' + '\n' + r'      <Structure Channels="_CHANNEL_NUM_" Interval="_INTERVAL_" Hstart="1" Hstop="1" Offset="0" Length="_WORDLENGTH_" Protocol="0" BlockPackingMode="0" BlockGroupCount="1" SubOffset="0" Lane="0" />' + '\n' + '_CONTENT_   </DataStream>\n'
         line_content_t = r'      <Content ChID="_CHANNEL_ID_" Wave="_INPUT_WAVEFORM_" Freq="1000" N="_FRAME_RATE_" M="1" Amplitude="-_AMP_dBFs" />' + '\n'
+        line_file_content_t = r'      <Content ChID="_CHANNEL_ID_" Wave="file" File="_STIM_FILE_" N="_FRAME_RATE_" M="1" />' + '\n'
 
         line_stream = line_stream.replace("_INTERVAL_", str(self.swire_bitrate/self.rx_samplerate))
         line_stream = line_stream.replace("_CHANNEL_NUM_", str(self.channel_num))
         line_stream = line_stream.replace("_WORDLENGTH_", str(self.rx_wordlength+1)) #stream def requires real length
 
+        if self.stream_stimulus:
+            if duration is None:
+                duration = self.calStreamLoop(self.stream_duration)[2]
+            if stim_prefix is None:
+                stim_prefix = self.output_path + r'stimulus'
+
         line_content = ""
         for i in range(self.channel_num):
-            line = line_content_t.replace('_CHANNEL_ID_', str(i))
-            line = line.replace("_FRAME_RATE_", str(self.swire_bitrate/(self.swire_rows*self.swire_cols)))
-            if self.input_pcm:
-                line = line.replace("_INPUT_WAVEFORM_", 'sine')
-                line = line.replace("_AMP_", '3')
+            if self.stream_stimulus:
+                line = line_file_content_t.replace('_CHANNEL_ID_', str(i))
+                line = line.replace("_STIM_FILE_", self.genSwireStimulus(i, stim_prefix, duration))
             else:
-                line = line.replace("_INPUT_WAVEFORM_", 'pdm_sine')
-                line = line.replace("_AMP_", '16')
+                line = line_content_t.replace('_CHANNEL_ID_', str(i))
+                if self.input_pcm:
+                    line = line.replace("_INPUT_WAVEFORM_", 'sine')
+                    line = line.replace("_AMP_", '3')
+                else:
+                    line = line.replace("_INPUT_WAVEFORM_", 'pdm_sine')
+                    line = line.replace("_AMP_", '16')
+            line = line.replace("_FRAME_RATE_", str(self.swire_bitrate/(self.swire_rows*self.swire_cols)))
             line_content += line
 
         line_stream = line_stream.replace('_CONTENT_', line_content)
-        out_file.write(line_stream)
+        frames.write(line_stream)
         tblog.infoLog("swire data stream content: {0}" .format(line_stream))
 
-    def genSwireStreamStart(self, out_file, rows, cols, ch_en):
+    def genSwireStreamStart(self, frames, rows, cols, ch_en):
         '''
         Generate shapiro data stream start script
         '''
-        line_sstart = r'<Swframe Repeat="1" rows="_STREAM_ROWS_" cols="_STREAM_COLS_" preq="0" StaticSync="177" Phy="0" DynamicSync="Valid" Parity="Valid" nak="0" ack="0" >' + '\n' + r'   <DataStream Id="A1" >' + '\n' + r'      <Start ChannelEnable="_STREAM_CH_EN_" />' + '\n' + '   </DataStream>\n' + r'   <controlword opcode="0" ssp="0" breq="0" brel="0" reserved="0" />' + '\n' + '</Swframe>\n'
-        line_sstart = line_sstart.replace("_STREAM_ROWS_", str(rows))
-        line_sstart = line_sstart.replace("_STREAM_COLS_", str(cols))
-        line_sstart = line_sstart.replace("_STREAM_CH_EN_", str(ch_en))
-        out_file.write(line_sstart)
+        frames.addStreamStart(ch_en, rows, cols)
+
+    def calStreamLoopFrames(self):
+        '''
+        calculate the minimal frame count of one stream loop body
+            the loop body has to cover whole ms(frame_rate frames) and whole dynamic sync periods(15 frames),
+            so it is LCM of frame_rate and 15
+        '''
+        return self.swire_framerate * swire_dsync_period / gcd(self.swire_framerate, swire_dsync_period)
 
-    def genSwireStreamLoop(self, out_file, rows, cols, loop=100):
+    def calStreamLoop(self, duration):
+        '''
+        calculate data stream loop for a target stream time(ms)
+            loop body is the minimal sync aligned frame count, loop count rounds target duration up
+        return (loop body frames, loop count, actual stream time(ms))
+        '''
+        loop_frames = self.calStreamLoopFrames()
+        total_frames = int(math.ceil(duration * self.swire_framerate))
+        loop = max(1, (total_frames + loop_frames - 1) / loop_frames)
+        return loop_frames, loop, float(loop * loop_frames) / self.swire_framerate
+
+    def genSwireStreamLoop(self, frames, rows, cols, duration=None):
         '''
         Generate shapiro data stream transfer script
+            duration: target stream time(ms), default is self.stream_duration
+        return actual stream time(ms)
         '''
-        line_stream = r'<Loop Repeat="_LOOP_">' + '\n'
-        line_stream = line_stream.replace("_LOOP_", str(loop))
-        out_file.write(line_stream)
-        
+        if duration is None:
+            duration = self.stream_duration
+
         '''
         calculate frame loop and enable ssp
-        FIXME: Should be LCM of frame_rate and 15(frames of dynamic sync period)
-                Here use frame_rate*15 temporarily
         '''
-        self.genSwirePing(out_file, self.swire_framerate*15, 1, rows, cols)
+        (loop_frames, loop, actual_duration) = self.calStreamLoop(duration)
+        tblog.infoLog("swire data stream: {0} frames x {1} loops, {2} ms (target {3} ms)" .format(loop_frames, loop, actual_duration, duration))
 
-        out_file.write("</Loop>\n")
+        frames.write("<!-- Route automation: stream {0} frames x {1} loops = {2} ms -->\n" .format(loop_frames, loop, actual_duration))
+
+        frames.addLoop(loop)
+        self.genSwirePing(frames, loop_frames, 1, rows, cols)
+        frames.addLoopEnd()
+        return actual_duration
 
     def updateSwireSetting(self):
         '''
@@ -697,15 +1351,10 @@ class LnkScriptMod(object):
         swire_route_properties['_DPTX_CHANNEL_EN_'][swire_reg_val] = chan_val
 
 
-    def setupRouteScript(self, route_num, output_dir, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength, frame_size):
+    def updateRouteConfig(self, route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength):
         '''
-        Setup route script from template
+        update route definition, stream format and swire setting of a route configuration
         '''
-        template = output_dir + self.route_template
-        if not os.path.isfile(template):
-            tblog.infoLog("Could not find route template file {0}!" .format(template))
-            raise BellagioError("Could not find route template file!")
-
         #get route definition: channel num/rx port/tx port
         self.channel_num = swire_route_def[route_num][swire_route_def_index['channel_num']]
         self.dp_rx = swire_route_def[route_num][swire_route_def_index['rx_port']]
@@ -737,74 +1386,374 @@ class LnkScriptMod(object):
         self.updateSwireSetting()
         tblog.infoLog("SWIRE route updated")
 
+    def calRouteScriptName(self, output_dir, route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength, frame_size, prefix=''):
+        return output_dir + prefix + os.path.splitext(self.route_script)[0] + str(route_num) + '_' + str(rx_samplerate) + 'K_' + str(rx_wordlength) + 'bit_'  + str(tx_samplerate) + 'K_' + str(tx_wordlength) + 'bit_' + str(frame_size) + 'ms.xml'
+
+    def setupRouteScript(self, route_num, output_dir, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength, frame_size, stream_duration=None):
+        '''
+        Setup route script from template
+            stream_duration: data stream transfer time(ms), default is self.stream_duration
+        '''
+        template = output_dir + self.route_template
+        if not os.path.isfile(template):
+            tblog.infoLog("Could not find route template file {0}!" .format(template))
+            raise BellagioError("Could not find route template file!")
+
+        self.updateRouteConfig(route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength)
+
         #gen route script name
-        route_script = output_dir + os.path.splitext(self.route_script)[0] + str(route_num) + '_' + str(rx_samplerate) + 'K_' + str(rx_wordlength) + 'bit_'  + str(tx_samplerate) + 'K_' + str(tx_wordlength) + 'bit_' + str(frame_size) + 'ms.xml'
+        route_script = self.calRouteScriptName(output_dir, route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength, frame_size)
 
         #when frame_size = 0.5ms, set shapiro 0x8035 = 0
         if frame_size < 1:
             frame_size = 0
 
-        with open(template) as route_in, open(route_script, 'w') as route_out:
-            for line in route_in:
-                '''
-                Gen script for shaprio route setup
-                '''
-                if re.search('start shapiro setup', line):
-                    route_out.write(line)
-                    self.genShapiroRouteSetting(route_out, route_num, frame_size)
-                    continue
+        return self.buildRouteScript(template, route_script, route_num, frame_size, stream_duration)
 
-                '''
-                gen script for swire route setup
-                '''
-                if re.search('start swire channel setup', line):
-                    route_out.write(line)
-                    self.genSwireRouteSetting(route_out)
-                    self.genSwireFrameShapeSetting(route_out)
-                    continue
+    def buildRouteScript(self, template, route_script, route_num, frame_size, stream_duration=None, transition=None):
+        '''
+        generate route script of current route configuration from template
+            transition: None for full setup(bus reset, enumeration, all registers),
+                        else calRouteTransition() result: bus reset/enumeration is skipped and only changed registers are written
+        return route script file name
+        '''
+        if stream_duration is None:
+            stream_duration = self.stream_duration
 
-                '''
-                gen script for swire data stream transfer and close 
-                '''
-                if re.search('start data stream', line):
-                    #start stream only when input is swire
-                    if self.dp_rx != 0:
-                        self.genSwireStreamStart(route_out, self.swire_rows, self.swire_cols, swire_route_properties['_DPRX_CHANNEL_EN_'][swire_reg_val])
-                    #loop for data transfer
-                    self.genSwireStreamLoop(route_out, self.swire_rows, self.swire_cols)
-
-                    #disable swire channel
-                    if self.dp_rx != 0:
-                        self.writeReadSwireReg(route_out, 1,  swire_route_properties['_DPRX_CHANNEL_EN_'][swire_reg_addr], 0, 1,  self.swire_rows, self.swire_cols)
-                    self.writeReadSwireReg(route_out, 1,  swire_route_properties['_DPTX_CHANNEL_EN_'][swire_reg_addr], 0, 1,  self.swire_rows, self.swire_cols)
-
-                    #delay 2 ms
-                    self.genSwirePing(route_out, self.calTimeInFrames(2), 0, self.swire_rows, self.swire_cols)
-
-                    #stop shapiro route
-                    self.writeShapiroReg(route_out, 0x8033, 0, 1, self.swire_rows, self.swire_cols)
-                    continue
+        frames = SwireFrames()
+        skip = False
+        for line in self.readTemplate(template):
+            if skip and not re.search('start shapiro setup', line):
+                continue
+            skip = False
+
+            '''
+            Gen script for shaprio route setup
+            '''
+            if re.search('start shapiro setup', line):
+                frames.write(line)
+                if transition:
+                    self.genShapiroTransition(frames, transition)
+                else:
+                    self.genShapiroRouteSetting(frames, route_num, frame_size)
+                continue
+
+            '''
+            gen script for swire route setup
+            '''
+            if re.search('start swire channel setup', line):
+                frames.write(line)
+                if transition:
+                    self.genSwireTransition(frames, transition)
+                else:
+                    self.genSwireRouteSetting(frames)
+                    self.genSwireFrameShapeSetting(frames)
+                continue
+
+            '''
+            gen script for swire data stream transfer and close 
+            '''
+            if re.search('start data stream', line):
+                #start stream only when input is swire
+                if self.dp_rx != 0:
+                    self.genSwireStreamStart(frames, self.swire_rows, self.swire_cols, swire_route_properties['_DPRX_CHANNEL_EN_'][swire_reg_val])
+                #loop for data transfer
+                self.genSwireStreamLoop(frames, self.swire_rows, self.swire_cols, stream_duration)
+
+                #disable swire channel
+                if self.dp_rx != 0:
+                    self.writeReadSwireReg(frames, 1,  swire_route_properties['_DPRX_CHANNEL_EN_'][swire_reg_addr], 0, 1,  self.swire_rows, self.swire_cols)
+                self.writeReadSwireReg(frames, 1,  swire_route_properties['_DPTX_CHANNEL_EN_'][swire_reg_addr], 0, 1,  self.swire_rows, self.swire_cols)
 
+                #delay 2 ms
+                self.genSwirePing(frames, self.calTimeInFrames(2), 0, self.swire_rows, self.swire_cols)
+
+                #stop shapiro route
+                self.writeShapiroReg(frames, shapiro_route_stop, 0, 1, self.swire_rows, self.swire_cols)
+                continue
+
+            '''
+            gen script for swire data stream def
+            '''
+            if re.search('start stream define', line):
+                frames.write(line)
+                #only when input is swire
+                if self.dp_rx != 0:
+                    self.genSwireStream(frames, self.calStreamLoop(stream_duration)[2], os.path.splitext(route_script)[0])
+                elif self.stream_stimulus:
+                    tblog.infoLog("LnkScriptMod: route {0} has no swire input, stream stimulus is not used" .format(route_num))
+                continue
+
+            if re.search('_DATE_', line):
+                #update date
+                line = line.replace("_DATE_", datetime.datetime.now().strftime("%m/%d/%Y"))
+                tblog.infoLog("route setup script updated: {0}" .format(line))
+
+            frames.write(line)
+
+            if transition and re.search('</Init>', line):
                 '''
-                gen script for swire data stream def
+                ###bus keeps sync and enumeration of previous route script: skip reset/enumeration till shapiro setup
                 '''
-                if re.search('start stream define', line):
-                    route_out.write(line)
-                    #only when input is swire
-                    if self.dp_rx != 0:
-                        self.genSwireStream(route_out)
-                    continue
+                frames.write(" \n<!-- Route automation: transition from route {0}, {1:.3f} ms reprogramming -->\n" .format(transition['from'], transition['cost_ms']))
+                skip = True
 
-                if re.search('_DATE_', line):
-                    #update date
-                    line = line.replace("_DATE_", datetime.datetime.now().strftime("%m/%d/%Y"))
-                    tblog.infoLog("route setup script updated: {0}" .format(line))
+        serializer = frame_serializers[self.script_format]()
+        with atomicOutput(route_script, serializer.file_mode, self.output_compression) as route_out:
+            serializer.write(frames, route_out)
+        if self.script_format == 'xml':
+            self.validateScript(route_script, transition['shape'][:2] if transition else None)
+        return outputName(route_script, self.output_compression)
 
-                route_out.write(line)
+    '''
+    ##############################################################
+       route transition: reprogram only changed registers between route configurations
+    ##############################################################
+    '''
+    def calRoutePlan(self, config):
+        '''
+        register plan of a route configuration
+            config: (route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength, frame_size), see setupRouteScript
+            routes without swire input keep frame rate of previous configuration, as setupRouteScript does
+        return dict:
+            config:     route configuration
+            shapiro:    shapiro register writes [(addr, val)]
+            swire:      SWIRE DP register writes [(addr, val)]
+            frame_ctrl: SCP_FrameCtrl value
+            teardown:   SWIRE registers cleared at end of route script [(addr, 0)]
+            shape:      (rows, cols, frame rate) of data stream
+            setup_ms:   bus time of register setup in full route script(setupRouteScript)
+        '''
+        (route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength, frame_size) = config
+        self.updateRouteConfig(route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength)
+        if frame_size < 1:
+            frame_size = 0
 
-        route_in.close()
-        route_out.close()
-        return route_script
+        teardown = [(swire_route_properties['_DPTX_CHANNEL_EN_'][swire_reg_addr], 0)]
+        if self.dp_rx != 0:
+            teardown.insert(0, (swire_route_properties['_DPRX_CHANNEL_EN_'][swire_reg_addr], 0))
+
+        #same setup frames as full route script
+        frames = SwireFrames()
+        self.genShapiroRouteSetting(frames, route_num, frame_size)
+        self.genSwireRouteSetting(frames)
+        self.genSwireFrameShapeSetting(frames)
+        return {
+            'config'    : tuple(config),
+            'shapiro'   : self.calShapiroRoutePlan(route_num, frame_size),
+            'swire'     : self.calSwireRoutePlan(),
+            'frame_ctrl': self.calFrameCtrl(),
+            'teardown'  : teardown,
+            'shape'     : (self.swire_rows, self.swire_cols, self.swire_framerate),
+            'setup_ms'  : self.calFramesTime(frames),
+            }
+
+    def calRouteTransition(self, prev, plan):
+        '''
+        register writes to switch from route "prev"(stopped and channels disabled at end of its script) to route "plan"
+            prev: calRoutePlan() of previous route, None after bus reset(full route script, cost is setup_ms of plan)
+        return dict:
+            shapiro:    changed shapiro registers, command sequence if changed, and route start
+            swire:      SWIRE DP registers which differ from previous route after its teardown
+            frame_ctrl: SCP_FrameCtrl value, None if frame shape is unchanged
+            shape:      (rows, cols, frame rate) of bus before frame shape change
+            delay:      frames of Shapiro write/read delays(calShapiroDelay)
+            cost_ms:    bus time of reprogramming, infinite if route can only be set up in full:
+                        Shapiro commands(0x800c/0x800d) of previous route can not be undone by register writes
+        '''
+        if prev is None:
+            transition = {
+                'from'      : 'reset',
+                'shapiro'   : list(plan['shapiro']),
+                'swire'     : list(plan['swire']),
+                'frame_ctrl': plan['frame_ctrl'],
+                'shape'     : (48, 2, self.swire_bitrate / (48*2)),
+                }
+        else:
+            prev_cmds = [(addr, val) for (addr, val) in prev['shapiro'] if addr in shapiro_cmd_regs]
+            cmds = [(addr, val) for (addr, val) in plan['shapiro'] if addr in shapiro_cmd_regs]
+            if prev_cmds and cmds != prev_cmds:
+                return {'from' : prev['config'][0], 'cost_ms' : float('inf')}
+            prev_shapiro = dict([(addr, val) for (addr, val) in prev['shapiro'] if addr not in shapiro_cmd_regs])
+            shapiro = []
+            for (addr, val) in plan['shapiro']:
+                if addr in shapiro_cmd_regs:
+                    if cmds != prev_cmds:
+                        shapiro.append((addr, val))
+                elif addr == shapiro_route_start or prev_shapiro.get(addr) != val:
+                    shapiro.append((addr, val))
+
+            state = dict(prev['swire'])
+            state.update(prev['teardown'])
+            transition = {
+                'from'      : prev['config'][0],
+                'shapiro'   : shapiro,
+                'swire'     : [(addr, val) for (addr, val) in plan['swire'] if state.get(addr) != val],
+                'frame_ctrl': plan['frame_ctrl'] if plan['frame_ctrl'] != prev['frame_ctrl'] else None,
+                'shape'     : prev['shape'],
+                }
+
+        (rows, cols) = transition['shape'][:2]
+        transition['delay'] = self.calShapiroDelay(plan['shape'][2], rows, cols)
+        if prev is None:
+            transition['cost_ms'] = plan['setup_ms']
+        else:
+            frames = SwireFrames()
+            self.genShapiroTransition(frames, transition)
+            self.genSwireTransition(frames, transition)
+            transition['cost_ms'] = self.calFramesTime(frames)
+        return transition
+
+    def genShapiroTransition(self, frames, transition):
+        (rows, cols, framerate) = transition['shape']
+        for (addr, val) in transition['shapiro']:
+            self.writeShapiroReg(frames, addr, val, 1, rows, cols, transition['delay'])
+
+    def genSwireTransition(self, frames, transition):
+        (rows, cols, framerate) = transition['shape']
+        self.genSwirePing(frames, 1, 0, rows, cols)
+        for (addr, val) in transition['swire']:
+            self.writeReadSwireReg(frames, 1, addr, val, 1, rows, cols)
+        if transition['frame_ctrl'] is not None:
+            self.genSwirePing(frames, 1, 0, rows, cols)
+            self.writeReadSwireReg(frames, 1, 0x70, transition['frame_ctrl'], 15, rows, cols)  #dev=15 to broadcast
+
+    def calFramesTime(self, frames):
+        '''
+        bus time(ms) of frames IR without loops
+        '''
+        bits = 0
+        for i in range(len(frames)):
+            if frames.kind[i] in (swire_frames.FRAME_PING, swire_frames.FRAME_RW, swire_frames.FRAME_STREAM_START):
+                bits += frames.repeat[i] * frames.rows[i] * frames.cols[i]
+        return float(bits) / self.swire_bitrate
+
+    def setupRouteTransitionScript(self, prev, plan, output_dir, stream_duration=None, prefix=''):
+        '''
+        Setup route script which switches from route "prev" to route "plan"
+            prev/plan: calRoutePlan() results, prev None for full setup
+            full setup is also generated if plan can not be reached by a transition(see calRouteTransition)
+        return route script file name
+        '''
+        template = output_dir + self.route_template
+        if not os.path.isfile(template):
+            tblog.infoLog("Could not find route template file {0}!" .format(template))
+            raise BellagioError("Could not find route template file!")
+
+        config = plan['config']
+        route_script = self.calRouteScriptName(output_dir, *config, prefix=prefix)
+        #routes without swire input keep current frame rate: restore the one of the plan
+        self.swire_framerate = plan['shape'][2]
+        self.updateRouteConfig(*config[:5])
+        transition = None
+        if prev is not None:
+            transition = self.calRouteTransition(prev, plan)
+            if transition['cost_ms'] == float('inf'):
+                tblog.infoLog("route {0} after route {1}: previous Shapiro commands stay active, full setup" .format(config[0], prev['config'][0]))
+                transition = None
+        return self.buildRouteScript(template, route_script, config[0], config[5] if config[5] >= 1 else 0, stream_duration, transition)
+
+    def calRouteResetTime(self, template):
+        '''
+        bus time(ms) of bus reset/enumeration frames of route template(after "</Init>" till shapiro setup)
+        '''
+        bits = 0
+        in_reset = False
+        for line in self.readTemplate(template):
+            if re.search('</Init>', line):
+                in_reset = True
+            elif re.search('start shapiro setup', line):
+                break
+            elif in_reset:
+                found = re.search('<Swframe Repeat="(\d+)" rows="(\d+)" cols="(\d+)"', line)
+                if found:
+                    bits += int(found.group(1)) * int(found.group(2)) * int(found.group(3))
+        return float(bits) / self.swire_bitrate
+
+    def orderRouteSweep(self, plans, reset_ms=0.0):
+        '''
+        order route configurations to minimize total reprogramming time:
+            full setup of first route(reset_ms + setup_ms) + cheaper of transition or full setup between neighbours
+            exact(Held-Karp) up to self.sweep_exact_max routes, else best greedy nearest neighbour path of all starts
+            reset_ms: bus reset/enumeration time of full route script, see calRouteResetTime
+        return (order, total cost ms)
+        '''
+        n = len(plans)
+        if n == 0:
+            return [], 0.0
+        start = [reset_ms + plan['setup_ms'] for plan in plans]
+        cost = [[min(self.calRouteTransition(plans[i], plans[j])['cost_ms'], start[j]) if i != j else 0.0 for j in range(n)] for i in range(n)]
+
+        if n <= self.sweep_exact_max:
+            '''
+            ###best[(set, last)] = (cost, previous), set is bit mask of visited routes
+            '''
+            best = dict([((1 << j, j), (start[j], None)) for j in range(n)])
+            for mask in range(1, 1 << n):
+                for last in range(n):
+                    if (mask, last) not in best:
+                        continue
+                    c = best[(mask, last)][0]
+                    for j in range(n):
+                        if mask & (1 << j):
+                            continue
+                        key = (mask | (1 << j), j)
+                        if key not in best or c + cost[last][j] < best[key][0]:
+                            best[key] = (c + cost[last][j], last)
+            full = (1 << n) - 1
+            last = min(range(n), key=lambda j: best[(full, j)][0])
+            total = best[(full, last)][0]
+            order = []
+            mask = full
+            while last is not None:
+                order.insert(0, last)
+                (c, prev) = best[(mask, last)]
+                mask &= ~(1 << last)
+                last = prev
+            return order, total
+
+        (order, total) = (None, None)
+        for first in range(n):
+            path = [first]
+            c = start[first]
+            left = set(range(n)) - set([first])
+            while left:
+                j = min(left, key=lambda k: (cost[path[-1]][k], k))
+                c += cost[path[-1]][j]
+                path.append(j)
+                left.remove(j)
+            if total is None or c < total:
+                (order, total) = (path, c)
+        return order, total
+
+    def genRouteSweep(self, configs, output_dir, stream_duration=None):
+        '''
+        Generate route scripts of a sweep in minimal reprogramming order
+            configs: list of (route_num, rx_samplerate, rx_wordlength, tx_samplerate, tx_wordlength, frame_size)
+            first script does full setup, the others only reprogram changed registers of previous script's route
+            unless full setup takes less bus time
+            scripts are named "sweepNN_<route script name>" in run order
+        return list of route script file names in run order
+        '''
+        template = output_dir + self.route_template
+        if not os.path.isfile(template):
+            tblog.infoLog("Could not find route template file {0}!" .format(template))
+            raise BellagioError("Could not find route template file!")
+        reset_ms = self.calRouteResetTime(template)
+
+        plans = [self.calRoutePlan(config) for config in configs]
+        (order, total) = self.orderRouteSweep(plans, reset_ms)
+        full_total = sum([reset_ms + plan['setup_ms'] for plan in plans])
+        tblog.infoLog("route sweep: {0} routes, reprogramming {1:.1f} ms(full setup of every route {2:.1f} ms)" .format(len(plans), total, full_total))
+
+        scripts = []
+        prev = None
+        for (k, i) in enumerate(order):
+            if prev is not None and self.calRouteTransition(prev, plans[i])['cost_ms'] >= reset_ms + plans[i]['setup_ms']:
+                prev = None     #full setup is faster
+            scripts.append(self.setupRouteTransitionScript(prev, plans[i], output_dir, stream_duration, "sweep{0:02d}_" .format(k)))
+            prev = plans[i]
+        return scripts
 
     def genRouteScript(self):
         '''
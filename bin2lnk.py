@@ -9,7 +9,11 @@ Created on 02/10/2017
 
 import bellagio.SystemLib.testbed_logging.testbedlog as tblog
 from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
+from bellagio.SystemLib.LnK.lnk_progress import LnkProgress, atomicOutput
 import os
+import binascii
+import threading
+import collections
 from __builtin__ import classmethod
 
 
@@ -33,6 +37,12 @@ class Bin2Lnk(object):
             self.char_size = 2                          #size of a ascii "char"
             self.dp_line_size = 4 * self.char_size      #size of one line dp file
             self.version=102                            #bin2lnk version
+            self.cache_images = False                   #keep converted images in memory(generation daemon)
+            self.image_cache = collections.OrderedDict()    #{bin_file : ((mtime, size), hex txt)}, least recently used first
+            self.image_cache_bytes = 256 << 20          #max total size of cached hex txt, least recently used images are evicted
+            self.image_cache_lock = threading.Lock()
+            self.chunk_dwords = 1 << 16                 #dwords per output write, progress/cancel granularity
+            self.output_compression = None              #None, 'gz' or 'xz'(see lnk_output)
             tblog.infoLog("bin2lnk initialization")
 
     @classmethod
@@ -51,51 +61,83 @@ class Bin2Lnk(object):
         self.version = ver
         tblog.infoLog("bin2lnk ver: {0}" .format(ver))
 
-    def bin2txt(self, bin_file, txt_file):
+    def readImage(self, bin_file):
         '''
-        convert binary to txt file and pad it to 4-byte aligned
-            bin_file:   binary file
-            txt_file:   swire txt file
+        read binary as txt(2 upper case hex chars per byte) padded to 4-byte aligned
+            converted image is kept in memory if cache_images is set, until the binary changes or
+            it is evicted as least recently used to keep cache within image_cache_bytes
         '''
         if not os.path.isfile(bin_file):
             raise BellagioError("bin2lnk could not find binary input!")
 
-        with open(bin_file, "rb") as bin_input, open(txt_file, 'w') as txt_output:
-            byte = bin_input.read(1)
-            tblog.infoLog("bin2txt {0:02X}" .format(ord(byte)))
-            count = 0
-            while byte != "":
-                line = "{0:02X}" .format(ord(byte))
-                txt_output.write(line)
-                byte = bin_input.read(1)
-                count += 1
-
-            tblog.infoLog("bin2txt size {0}" .format(count))
-            if count&0x3:
-                for i in range(4 - (count&0x3)):
-                    txt_output.write("00")
+        key = (os.path.getmtime(bin_file), os.path.getsize(bin_file))
+        with self.image_cache_lock:
+            cached = self.image_cache.pop(bin_file, None)
+            if cached and cached[0] == key:
+                self.image_cache[bin_file] = cached     #most recently used
+                return cached[1]
 
+        with open(bin_file, "rb") as bin_input:
+            data = bin_input.read()
         bin_input.close()
-        txt_output.close()
+        tblog.infoLog("bin2txt size {0}" .format(len(data)))
+
+        if len(data)&0x3:
+            data += "\0" * (4 - (len(data)&0x3))
+        txt = binascii.hexlify(data).upper()
+
+        if self.cache_images:
+            self.cacheImage(bin_file, key, txt)
+        return txt
+
+    def cacheImage(self, bin_file, key, txt):
+        '''
+        add converted image to cache, evict least recently used images over image_cache_bytes
+        '''
+        if len(txt) > self.image_cache_bytes:
+            return
+        with self.image_cache_lock:
+            self.image_cache[bin_file] = (key, txt)
+            size = sum([len(cached[1]) for cached in self.image_cache.values()])
+            while size > self.image_cache_bytes:
+                (name, cached) = self.image_cache.popitem(last=False)
+                size -= len(cached[1])
+                tblog.infoLog("bin2lnk image cache: evicted {0}" .format(name))
+
+    def bin2txt(self, bin_file, txt_file, progress=None, cancel=None):
+        '''
+        convert binary to txt file and pad it to 4-byte aligned
+            bin_file:   binary file
+            txt_file:   swire txt file
+            progress:   callback(done_bytes, total_bytes, dwords_per_sec, eta_sec)
+            cancel:     lnk_progress.CancelToken
+        '''
+        txt = self.readImage(bin_file)
+        report = LnkProgress("bin2txt", len(txt) / self.char_size, progress, cancel)
+
+        chunk = self.chunk_dwords * self.dp_line_size
+        with atomicOutput(txt_file, compression=self.output_compression) as txt_output:
+            for start in range(0, len(txt), chunk):
+                report.update(start / self.char_size)
+                txt_output.write(txt[start:start+chunk])
+            report.update(len(txt) / self.char_size)
+
         tblog.infoLog("binary to txt done!")
 
-    def bin2Dp(self, bin_file, dp_file):
+    def bin2Dp(self, bin_file, dp_file, progress=None, cancel=None):
         '''
         convert binary to swire dp downloading file
             bin_file:   binary file
             dp_file:   swire dp file
+            progress:   callback(done_bytes, total_bytes, dwords_per_sec, eta_sec)
+            cancel:     lnk_progress.CancelToken
         '''
         tblog.infoLog("bin2Dp: input-{0} output-{1}" .format(bin_file, dp_file))
 
-        if not os.path.isfile(bin_file):
-            raise BellagioError("bin2lnk could not find binary input!")
-
-        self.bin2txt(bin_file, self.tmp_txt);    #convert binary to txt first
-
-        if not os.path.isfile(self.tmp_txt):
-            raise BellagioError("bin2lnk failed to generate tmp txt!")
+        txt = self.readImage(bin_file)      #convert binary to txt first
+        report = LnkProgress("bin2Dp", len(txt) / self.char_size, progress, cancel)
 
-        with open(self.tmp_txt, "r") as txt_input, open(dp_file, 'w') as dp_output:
+        with atomicOutput(dp_file, compression=self.output_compression) as dp_output:
             '''
             ###8-byte 00 header, no need after v103
             '''
@@ -103,23 +145,17 @@ class Bin2Lnk(object):
                 for i in range(2):
                     dp_output.write("00000000\n")
 
-            dword = txt_input.read(self.dp_line_size)       #read 4-char per line for DP format
-            tblog.infoLog("bin2Dp: {0}" .format(dword))
-            count = 0
-            while dword != "":
-                l = list(dword)
-                '''
-                ###use big-endian
-                '''
-                line = "{0}{1}{2}{3}\n" .format(l[6]+l[7], l[4]+l[5], l[2]+l[3], l[0]+l[1])
-                dp_output.write(line)
-                dword = txt_input.read(self.dp_line_size)
-                count += 1
+            '''
+            ###read 4-char per line for DP format and use big-endian
+            '''
+            count = len(txt) / self.dp_line_size
+            chunk = self.chunk_dwords * self.dp_line_size
+            for start in range(0, len(txt), chunk):
+                report.update(start / self.char_size)
+                dp_output.write("".join([txt[i+6:i+8] + txt[i+4:i+6] + txt[i+2:i+4] + txt[i:i+2] + "\n" for i in range(start, min(start + chunk, len(txt)), self.dp_line_size)]))
+            report.update(len(txt) / self.char_size)
             tblog.infoLog("bin2txt size {0}" .format(count))
 
-        txt_input.close()
-        dp_output.close()
-        #os.remove(self.tmp_txt)
         tblog.infoLog("binary to dp done!")
 
 if __name__ == "__main__":
@@ -0,0 +1,537 @@
+'''
+lnk_capture:
+compare LnK analyzer capture export against the control word sequence of a generated LnK script
+    expected:   register read/write transactions of script in bus order, loops expanded
+                event number is "Event #" of the control words if every control word has one(CP download),
+                else bus frame number of every transaction(0 based, repeats and loops counted)
+    capture:    csv/text export, one frame per line, header names the columns(see capture_columns)
+                ping frames are skipped, columns are parsed with vectorized numpy operations
+    report:     missing(expected, not captured), extra(captured, not expected) and mismatched transactions,
+                from minimal edit alignment of the transactions around each difference
+
+Created on 10/19/2026
+'''
+
+import bellagio.SystemLib.testbed_logging.testbedlog as tblog
+from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
+from bellagio.SystemLib.LnK.lnk_output import openInput
+import re
+import sys
+import numpy as np
+
+#script tokens of expected transactions
+script_token = re.compile(
+    r'<(?:Swframe Repeat="(?P<frame>\d+)"'
+    r'|Loop Repeat="(?P<loop>\d+)"'
+    r'|(?P<loop_end>/Loop>)'
+    r'|!-- Event #(?P<event>\d+) : (?:READ|WRITE) '
+    r'|controlword opcode="(?P<opcode>[23])" DeviceAddress="(?P<dev>\d+)" RegisterAddress="0x(?P<addr>[0-9a-fA-F]+)" Data="0x(?P<data>[0-9a-fA-F]+)")'
+    )
+
+#transaction columns in order: capture header name aliases(lower case, no space/underscore)
+capture_columns = (
+    ('event',   ('event', 'eventnum', 'event#', 'frame', 'framenum', 'frame#', 'index', 'no', '#')),
+    ('opcode',  ('opcode', 'op', 'command', 'cmd')),
+    ('dev',     ('dev', 'device', 'deviceaddress', 'devaddr')),
+    ('addr',    ('addr', 'address', 'registeraddress', 'regaddr', 'reg')),
+    ('data',    ('data', 'value')),
+    )
+capture_delimiters = (',', '\t', ';', ' ')
+
+#opcode name in capture -> opcode, by first char
+opcode_code = {
+    'P' : 0,    #PING
+    'R' : 2,    #READ
+    'W' : 3,    #WRITE
+    }
+
+#digit value of ascii char, -1: not a digit(skipped, e.g. "0x", quotes, spaces, "\r")
+dec_digit = np.full(256, -1, dtype=np.int8)
+dec_digit[ord('0'):ord('9')+1] = np.arange(10)
+hex_digit = dec_digit.copy()
+hex_digit[ord('a'):ord('f')+1] = np.arange(10, 16)
+hex_digit[ord('A'):ord('F')+1] = np.arange(10, 16)
+hex_chars = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+
+#capture/expected csv written by this module: (column, base, digits, prefix)
+capture_format = (
+    ('event',   10, 10, ''),
+    ('opcode',  10, 1,  ''),
+    ('dev',     10, 2,  ''),
+    ('addr',    16, 4,  '0x'),
+    ('data',    16, 2,  '0x'),
+    )
+
+
+class LnkCaptureCompare(object):
+    '''
+    export expected transactions of LnK script and compare them with analyzer capture
+        transactions are dict of numpy arrays: event, opcode, dev, addr, data
+    '''
+    ROBOT_LIBRARY_SCOPE = 'GLOBAL'
+
+    def __init__(self, chunk_size=1 << 24, window=64, sync_len=4, max_report=100, ignore_read_data=True):
+        self.chunk_size = chunk_size            #bytes per read
+        self.window = window                    #transactions aligned after a difference: 2*window from each side
+        self.sync_len = sync_len                #matching transactions which end a difference
+        self.max_report = max_report            #differences kept for report, rest are only counted
+        self.ignore_read_data = ignore_read_data    #read data comes from device, not from script
+
+    def readChunks(self, in_file):
+        '''
+        yield chunks of complete lines
+        '''
+        rest = ''
+        while True:
+            chunk = in_file.read(self.chunk_size)
+            if not chunk:
+                if rest:
+                    yield rest
+                break
+            chunk = rest + chunk
+            end = chunk.rfind('\n') + 1
+            (chunk, rest) = (chunk[:end], chunk[end:])
+            if chunk:
+                yield chunk
+
+    '''
+    ##############################################################
+       expected transactions
+    ##############################################################
+    '''
+    def readScript(self, script_file):
+        '''
+        return expected transactions of script
+        '''
+        '''
+        one level per open loop: [loop repeat, frames, event, frame offset, opcode, dev, addr, data]
+            event: "Event #" of control word, -1 if none
+            frame offset: frame number in loop body
+        '''
+        levels = [[1, 0, [], [], [], [], [], []]]
+        event = -1
+        repeat = 1
+        with openInput(script_file) as script:
+            for chunk in self.readChunks(script):
+                for token in script_token.finditer(chunk):
+                    kind = token.lastgroup
+                    level = levels[-1]
+                    if kind == 'frame':
+                        repeat = int(token.group('frame'))
+                        level[1] += repeat
+                    elif kind == 'data':
+                        for r in range(repeat):
+                            level[2].append(event)
+                            level[3].append(level[1] - repeat + r)
+                        level[4].extend([int(token.group('opcode'))] * repeat)
+                        level[5].extend([int(token.group('dev'))] * repeat)
+                        level[6].extend([int(token.group('addr'), 16)] * repeat)
+                        level[7].extend([int(token.group('data'), 16)] * repeat)
+                        event = -1
+                    elif kind == 'event':
+                        event = int(token.group('event'))
+                    elif kind == 'loop':
+                        levels.append([int(token.group('loop')), 0, [], [], [], [], [], []])
+                    elif kind == 'loop_end':
+                        if len(levels) == 1:
+                            raise BellagioError("lnk_capture: </Loop> without Loop in {0}!" .format(script_file))
+                        self.closeLoop(levels)
+        script.close()
+        if len(levels) != 1:
+            raise BellagioError("lnk_capture: Loop not closed in {0}!" .format(script_file))
+
+        level = levels[0]
+        event = np.array(level[2], dtype=np.int64)
+        if (event < 0).any():
+            #not all control words have "Event #"(e.g. route script): bus frame numbers only
+            event = np.array(level[3], dtype=np.int64)
+        expected = {
+            'event'     : event,
+            'opcode'    : np.array(level[4], dtype=np.int64),
+            'dev'       : np.array(level[5], dtype=np.int64),
+            'addr'      : np.array(level[6], dtype=np.int64),
+            'data'      : np.array(level[7], dtype=np.int64),
+            }
+        tblog.infoLog("lnk_capture: {0} expected transactions in {1} frames of {2}" .format(len(event), level[1], script_file))
+        return expected
+
+    def closeLoop(self, levels):
+        '''
+        expand innermost loop into its parent level
+        '''
+        (repeat, frames) = levels[-1][:2]
+        body = levels.pop()
+        parent = levels[-1]
+        count = len(body[4])
+        if count:
+            offsets = np.repeat(np.arange(repeat, dtype=np.int64) * frames, count) + parent[1]
+            parent[2].extend(body[2] * repeat)
+            parent[3].extend((np.tile(np.array(body[3], dtype=np.int64), repeat) + offsets).tolist())
+            for column in range(4, 8):
+                parent[column].extend(body[column] * repeat)
+        parent[1] += repeat * frames
+
+    '''
+    ##############################################################
+       capture file
+    ##############################################################
+    '''
+    def parseHeader(self, header):
+        '''
+        return (delimiter, field index of each capture column)
+        '''
+        header = header.rstrip('\r\n')
+        delimiter = max(capture_delimiters, key=header.count)
+        names = [re.sub(r'[\s_"\']', '', name).lower() for name in header.split(delimiter)]
+        fields = []
+        for (column, aliases) in capture_columns:
+            found = [i for (i, name) in enumerate(names) if name in aliases]
+            if not found:
+                raise BellagioError("lnk_capture: no {0} column in capture header {1}" .format(column, header))
+            fields.append(found[0])
+        return delimiter, len(names), fields
+
+    def parseField(self, chunk, start, end, column):
+        '''
+        parse one field of all lines: integers in decimal, "0x" hex, or opcode names
+            start/end: field position of each line
+        '''
+        width = int((end - start).max()) if len(start) else 0
+        if width == 0:
+            return np.zeros(len(start), dtype=np.int64)
+        index = np.minimum(start[:, None] + np.arange(width), len(chunk) - 1)
+        chars = chunk[index]
+        chars[np.arange(width) >= (end - start)[:, None]] = ord(' ')
+        chars[chars == ord('"')] = ord(' ')
+
+        if column == 'addr' or column == 'data':
+            #register address/data are hex in LnK exports even without "0x"
+            (digit, base) = (hex_digit[chars], 16)
+        else:
+            is_hex = ((chars == ord('x')) | (chars == ord('X'))).any(axis=1)
+            if not is_hex.any():
+                (digit, base) = (dec_digit[chars], 10)
+            else:
+                digit = np.where(is_hex[:, None], hex_digit[chars], dec_digit[chars])
+                base = np.where(is_hex, 16, 10)
+
+        value = np.zeros(len(start), dtype=np.int64)
+        for k in range(width):
+            d = digit[:, k]
+            value = np.where(d >= 0, value * base + d, value)
+
+        if column == 'opcode':
+            #opcode names(PING/READ/WRITE)
+            first = chars[np.arange(len(start)), (chars == ord(' ')).argmin(axis=1)]
+            for (name, code) in opcode_code.items():
+                value[(first == ord(name)) | (first == ord(name.lower()))] = code
+        return value
+
+    def fixLines(self, chunk, delimiter, field_num, frames):
+        '''
+        drop empty lines of chunk and check every line has field_num fields
+        return (chunk, field boundaries)
+        '''
+        line_end = np.flatnonzero(chunk == ord('\n'))
+        line_start = np.concatenate(([0], line_end[:-1] + 1))
+        blank = np.flatnonzero((line_end - line_start) <= (chunk[line_end - 1] == ord('\r')))
+        if len(blank):
+            keep = np.ones(len(chunk), dtype=bool)
+            keep[line_end[blank]] = False
+            chunk = chunk[keep]
+            line_end = np.flatnonzero(chunk == ord('\n'))
+
+        bounds = np.flatnonzero((chunk == ord(delimiter)) | (chunk == ord('\n')))
+        per_line = np.diff(np.concatenate(([0], np.searchsorted(bounds, line_end, side='right'))))
+        bad = np.flatnonzero(per_line != field_num)
+        if len(bad):
+            raise BellagioError("lnk_capture: capture line {0} does not have {1} fields!" .format(frames + bad[0] + 2, field_num))
+        return chunk, bounds
+
+    def readCapture(self, capture_file):
+        '''
+        return captured register read/write transactions
+        '''
+        columns = dict([(column, []) for (column, aliases) in capture_columns])
+        frames = 0
+        with openInput(capture_file) as capture:
+            (delimiter, field_num, fields) = self.parseHeader(capture.readline())
+            for text in self.readChunks(capture):
+                if not text.endswith('\n'):
+                    text += '\n'
+                chunk = np.frombuffer(text, dtype=np.uint8)
+
+                '''
+                ###field boundaries: every line must have field_num fields
+                '''
+                bounds = np.flatnonzero((chunk == ord(delimiter)) | (chunk == ord('\n')))
+                if len(bounds) % field_num or (chunk[bounds[field_num-1::field_num]] != ord('\n')).any():
+                    #empty lines or bad lines, rare
+                    (chunk, bounds) = self.fixLines(chunk, delimiter, field_num, frames)
+                bounds = bounds.reshape(-1, field_num)
+                line_end = bounds[:, -1]
+                lines = len(line_end)
+                line_start = np.concatenate(([0], line_end[:-1] + 1))
+                field_start = lambda field: line_start if field == 0 else bounds[:, field - 1] + 1
+
+                '''
+                ###parse opcode of all frames, other columns only of read/write frames
+                '''
+                field = fields[1]
+                opcode = self.parseField(chunk, field_start(field), bounds[:, field], 'opcode')
+                rw = np.flatnonzero((opcode == 2) | (opcode == 3))
+                columns['opcode'].append(opcode[rw])
+                for ((column, aliases), field) in zip(capture_columns, fields):
+                    if column != 'opcode':
+                        columns[column].append(self.parseField(chunk, field_start(field)[rw], bounds[rw, field], column))
+                frames += lines
+        capture.close()
+
+        captured = dict([(column, np.concatenate(columns[column]) if columns[column] else np.zeros(0, dtype=np.int64)) for column in columns])
+        tblog.infoLog("lnk_capture: {0} transactions in {1} frames of {2}" .format(len(captured['event']), frames, capture_file))
+        return captured
+
+    '''
+    ##############################################################
+       compare
+    ##############################################################
+    '''
+    def transactionKey(self, trans):
+        '''
+        one int64 per transaction: opcode | dev | addr | data
+        '''
+        data = trans['data']
+        if self.ignore_read_data:
+            data = np.where(trans['opcode'] == 3, data, 0)
+        return (trans['opcode'] << 32) | (trans['dev'] << 24) | (trans['addr'] << 8) | data
+
+    def firstDiff(self, ek, ck, i, j):
+        '''
+        return length of matching run of ek[i:] and ck[j:]
+        '''
+        total = min(len(ek) - i, len(ck) - j)
+        done = 0
+        step = 1024
+        while done < total:
+            n = min(step, total - done)
+            diff = np.flatnonzero(ek[i+done:i+done+n] != ck[j+done:j+done+n])
+            if len(diff):
+                return done + diff[0]
+            done += n
+            step = min(step * 4, 1 << 20)
+        return total
+
+    def align(self, e, c):
+        '''
+        minimal edit alignment of key arrays e and c(mismatch, missing and extra cost 1 each)
+        return ops in order: 'match'/'mismatch'(e and c advance), 'missing'(e advances), 'extra'(c advances)
+        '''
+        (a, b) = (len(e), len(c))
+        cols = np.arange(b + 1)
+        rows = [cols]
+        for x in range(1, a + 1):
+            prev = rows[-1]
+            row = np.empty(b + 1, dtype=np.int64)
+            row[0] = x
+            row[1:] = np.minimum(prev[1:] + 1, prev[:-1] + (c != e[x-1]))
+            #extra transactions: row[y] = min over k <= y of row[k] + (y - k)
+            rows.append(np.minimum.accumulate(row - cols) + cols)
+
+        ops = []
+        (x, y) = (a, b)
+        while x or y:
+            if x and y and rows[x][y] == rows[x-1][y-1] + (e[x-1] != c[y-1]):
+                ops.append('match' if e[x-1] == c[y-1] else 'mismatch')
+                (x, y) = (x - 1, y - 1)
+            elif x and rows[x][y] == rows[x-1][y] + 1:
+                ops.append('missing')
+                x -= 1
+            else:
+                ops.append('extra')
+                y -= 1
+        ops.reverse()
+        return ops
+
+    def resync(self, ek, ck, i, j):
+        '''
+        align ek[i:] and ck[j:] after a difference
+        return ops(see align) till transactions match again for sync_len
+        '''
+        length = 2 * self.window
+        e = ek[i:i+length]
+        c = ck[j:j+length]
+        ops = self.align(e, c)
+        if i + len(e) == len(ek) and j + len(c) == len(ck):
+            return ops      #aligned to the end
+
+        '''
+        ###alignment near window end is cut off: keep ops till first sync_len matches
+        '''
+        run = 0
+        for (k, op) in enumerate(ops):
+            run = run + 1 if op == 'match' else 0
+            if run == self.sync_len:
+                return ops[:k + 1 - run]
+        return ops[:max(1, len(ops) / 2)]
+
+    def compare(self, expected, captured):
+        '''
+        compare transactions in order
+        return list of (kind, expected event, captured event, expected (opcode, dev, addr, data), captured (opcode, dev, addr, data))
+            kind: missing/extra/mismatch, at most max_report
+        '''
+        self.report = []
+        self.counts = {'missing' : 0, 'extra' : 0, 'mismatch' : 0}
+        ek = self.transactionKey(expected)
+        ck = self.transactionKey(captured)
+        (n, m) = (len(ek), len(ck))
+
+        (i, j) = (0, 0)
+        while i < n and j < m:
+            run = self.firstDiff(ek, ck, i, j)
+            (i, j) = (i + run, j + run)
+            if i == n or j == m:
+                break
+            for op in self.resync(ek, ck, i, j):
+                if op == 'match':
+                    (i, j) = (i + 1, j + 1)
+                elif op == 'mismatch':
+                    self.addDiff('mismatch', expected, i, captured, j)
+                    (i, j) = (i + 1, j + 1)
+                elif op == 'missing':
+                    self.addDiff('missing', expected, i, captured, None)
+                    i += 1
+                else:
+                    self.addDiff('extra', expected, None, captured, j)
+                    j += 1
+
+        for k in range(i, n):
+            self.addDiff('missing', expected, k, captured, None)
+        for k in range(j, m):
+            self.addDiff('extra', expected, None, captured, k)
+
+        tblog.infoLog("lnk_capture: {0} expected {1} captured: {2} missing {3} extra {4} mismatched" .format(n, m, self.counts['missing'], self.counts['extra'], self.counts['mismatch']))
+        return self.report
+
+    def addDiff(self, kind, expected, i, captured, j):
+        self.counts[kind] += 1
+        if len(self.report) < self.max_report:
+            exp = None if i is None else tuple([int(expected[column][i]) for column in ('opcode', 'dev', 'addr', 'data')])
+            cap = None if j is None else tuple([int(captured[column][j]) for column in ('opcode', 'dev', 'addr', 'data')])
+            self.report.append((kind,
+                                None if i is None else int(expected['event'][i]),
+                                None if j is None else int(captured['event'][j]),
+                                exp, cap))
+
+    def compareCapture(self, script_file, capture_file):
+        '''
+        compare capture file against expected transactions of script file
+        return list of differences(see compare), total counts in self.counts
+        '''
+        return self.compare(self.readScript(script_file), self.readCapture(capture_file))
+
+    def formatDiff(self, diff):
+        (kind, exp_event, cap_event, exp, cap) = diff
+        text = lambda t: "op {0} dev {1} 0x{2:04x}=0x{3:02x}" .format(*t) if t else "-"
+        return "{0:8s} expected #{1}: {2}  captured #{3}: {4}" .format(kind, exp_event if exp_event is not None else '-', text(exp),
+                                                                  cap_event if cap_event is not None else '-', text(cap))
+
+    '''
+    ##############################################################
+       export
+    ##############################################################
+    '''
+    def writeTransactions(self, out_name, trans, rows=1 << 20):
+        '''
+        write transactions as capture csv(capture_format), vectorized in blocks of rows
+        '''
+        width = sum([len(prefix) + digits + 1 for (column, base, digits, prefix) in capture_format])
+        count = len(trans['event'])
+        with open(out_name, 'wb') as out_file:
+            out_file.write(','.join([column for (column, base, digits, prefix) in capture_format]) + '\n')
+            for start in range(0, count, rows):
+                stop = min(start + rows, count)
+                lines = np.empty((stop - start, width), dtype=np.uint8)
+                pos = 0
+                for (column, base, digits, prefix) in capture_format:
+                    value = trans[column][start:stop]
+                    if (value < 0).any() or (value >= base ** digits).any():
+                        raise BellagioError("lnk_capture: {0} out of range for capture format!" .format(column))
+                    for ch in prefix:
+                        lines[:, pos] = ord(ch)
+                        pos += 1
+                    for k in range(digits):
+                        lines[:, pos] = hex_chars[(value // (base ** (digits - 1 - k))) % base]
+                        pos += 1
+                    lines[:, pos] = ord(',')
+                    pos += 1
+                lines[:, -1] = ord('\n')
+                out_file.write(lines.tobytes())
+        out_file.close()
+
+    def exportExpected(self, script_file, out_name):
+        '''
+        write expected transactions of script as capture csv
+        return number of transactions
+        '''
+        expected = self.readScript(script_file)
+        self.writeTransactions(out_name, expected)
+        return len(expected['event'])
+
+    def genSyntheticCapture(self, script_file, out_name, ping_frames=0, drop=0, extra=0, corrupt=0, seed=0):
+        '''
+        write synthetic capture of script for offline test
+            ping_frames: ping frames after each transaction
+            drop/extra/corrupt: number of transactions dropped, inserted and with flipped data
+        return injected (dropped, inserted, corrupted) index lists(into expected/synthetic transactions)
+        '''
+        rng = np.random.RandomState(seed)
+        trans = self.readScript(script_file)
+        n = len(trans['event'])
+
+        dropped = np.sort(rng.choice(n, drop, replace=False)) if drop else np.zeros(0, dtype=np.int64)
+        keep = np.ones(n, dtype=bool)
+        keep[dropped] = False
+        trans = dict([(column, value[keep]) for (column, value) in trans.items()])
+
+        corrupted = np.sort(rng.choice(len(trans['event']), corrupt, replace=False)) if corrupt else np.zeros(0, dtype=np.int64)
+        trans['opcode'][corrupted] = 3      #write, so data is compared
+        trans['data'][corrupted] ^= 0x5a
+
+        inserted = np.sort(rng.choice(len(trans['event']) + 1, extra, replace=True)) if extra else np.zeros(0, dtype=np.int64)
+        if extra:
+            bogus = {'opcode' : 3, 'dev' : 15, 'addr' : 0xdead & 0xffff, 'data' : 0xa5}
+            for column in trans:
+                fill = trans['event'][np.minimum(inserted, len(trans['event']) - 1)] if column == 'event' else bogus[column]
+                trans[column] = np.insert(trans[column], inserted, fill)
+
+        if ping_frames:
+            #each transaction followed by ping frames with its event number
+            for column in trans:
+                frames = np.repeat(trans[column], ping_frames + 1)
+                if column != 'event':
+                    frames.reshape(-1, ping_frames + 1)[:, 1:] = 0
+                trans[column] = frames
+
+        self.writeTransactions(out_name, trans)
+        return dropped.tolist(), inserted.tolist(), corrupted.tolist()
+
+if __name__ == "__main__":
+    '''
+    lnk_capture.py compare <script> <capture>
+    lnk_capture.py export <script> <csv>
+    lnk_capture.py synth <script> <csv> [ping frames] [drop] [extra] [corrupt]
+    '''
+    comparator = LnkCaptureCompare()
+    if len(sys.argv) >= 4 and sys.argv[1] == 'compare':
+        for diff in comparator.compareCapture(sys.argv[2], sys.argv[3]):
+            print comparator.formatDiff(diff)
+        print "{0} missing {1} extra {2} mismatched" .format(comparator.counts['missing'], comparator.counts['extra'], comparator.counts['mismatch'])
+        sys.exit(1 if sum(comparator.counts.values()) else 0)
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'export':
+        print comparator.exportExpected(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'synth':
+        print comparator.genSyntheticCapture(sys.argv[2], sys.argv[3], *[int(arg) for arg in sys.argv[4:8]])
+    else:
+        print "usage: lnk_capture.py compare <script> <capture> | export <script> <csv> | synth <script> <csv> [ping_frames drop extra corrupt]"
+        sys.exit(2)
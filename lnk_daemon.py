@@ -0,0 +1,313 @@
+'''
+lnk_daemon:
+long-lived LnK script generation daemon
+    keeps templates and converted images warm in LnkScriptMod/Bin2Lnk singletons
+    accepts DP/CP/route jobs on a unix socket or localhost port and runs them on a worker pool
+
+protocol: one JSON object per line
+    request:  {"id" : 1, "job" : "route", "args" : {...}}
+    response: {"id" : 1, "status" : "queued"}, then
+              {"id" : 1, "status" : "done", "result" : ..., "time_ms" : ...} or
+              {"id" : 1, "status" : "error", "error" : "..."}
+    responses of one connection are streamed back as jobs finish(not in request order)
+
+Created on 10/19/2026
+'''
+
+import bellagio.SystemLib.testbed_logging.testbedlog as tblog
+from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
+from bellagio.SystemLib.LnK.LnkScriptMod import LnkScriptMod
+from bellagio.SystemLib.LnK.bin2lnk import Bin2Lnk
+from bellagio.SystemLib.LnK.lnk_output import outputName
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import Queue
+import SocketServer
+
+#default daemon address: unix socket if supported, else localhost port
+if hasattr(socket, 'AF_UNIX'):
+    default_address = r'/tmp/lnk_daemon.sock'
+else:
+    default_address = ('127.0.0.1', 17345)
+
+#job : {argument : (types, required)}, checked before a job is queued
+job_arg_types = {
+    'route' : {
+        'route_num'         : ((int, long), True),
+        'output_dir'        : (basestring, True),
+        'rx_samplerate'     : ((int, long), True),
+        'rx_wordlength'     : ((int, long), True),
+        'tx_samplerate'     : ((int, long), True),
+        'tx_wordlength'     : ((int, long), True),
+        'frame_size'        : ((int, long, float), True),
+        'stream_duration'   : ((int, long, float), False),
+        },
+    'cp' : {
+        'bin_file'          : (basestring, True),
+        'cp_dl_script'      : (basestring, True),
+        },
+    'dp' : {
+        'bin_file'          : (basestring, True),
+        'dp_file'           : (basestring, True),
+        },
+    }
+
+
+class LnkJobHandler(SocketServer.StreamRequestHandler):
+    '''
+    read job requests from one connection and stream back results
+    '''
+    def handle(self):
+        write_lock = threading.Lock()
+
+        def reply(msg):
+            with write_lock:
+                try:
+                    self.wfile.write(json.dumps(msg) + '\n')
+                    self.wfile.flush()
+                except socket.error:
+                    pass    #client gone, job result is dropped
+
+        pending = []
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                reply({'status' : 'error', 'error' : 'bad request'})
+                continue
+            pending.append(self.server.lnk_daemon.submit(request, reply))
+
+        #keep connection open until all its jobs are answered
+        for done in pending:
+            done.wait()
+
+
+class LnkTCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+if hasattr(SocketServer, 'UnixStreamServer'):
+    class LnkUnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+        daemon_threads = True
+
+
+class LnkGenDaemon(object):
+    '''
+    script generation daemon: job queue + worker pool
+    '''
+    ROBOT_LIBRARY_SCOPE = 'GLOBAL'
+
+    def __init__(self, address=default_address, workers=4, output_path=None):
+        '''
+            output_path: LnkScriptMod output/template directory, None to keep current
+        '''
+        self.address = address
+        self.workers = workers
+        self.jobs = Queue.Queue()
+        self.server = None
+
+        '''
+        route jobs update module level swire LUT in LnkScriptMod: run them one at a time
+        CP/DP jobs only read shared settings and can run concurrently
+        '''
+        self.route_lock = threading.Lock()
+        self.job_types = {
+            'route' : self.runRoute,
+            'cp'    : self.runCtrlPort,
+            'dp'    : self.runDataPort,
+            }
+
+        self.lnk_mod = LnkScriptMod.getInstance()
+        if output_path:
+            self.lnk_mod.output_path = output_path
+        #CP jobs run concurrently on worker threads: no process pool forked per job from this multithreaded process
+        self.lnk_mod.cp_workers = 1
+        self.bin2lnk = Bin2Lnk.getInstance()
+        self.bin2lnk.cache_images = True
+        tblog.infoLog("LnK daemon initialization: {0} workers {1}" .format(address, workers))
+
+    '''
+    ##############################################################
+       jobs
+    ##############################################################
+    '''
+    def runRoute(self, args):
+        '''
+        args: LnkScriptMod.setupRouteScript arguments
+        '''
+        with self.route_lock:
+            return self.lnk_mod.setupRouteScript(args['route_num'], args['output_dir'], args['rx_samplerate'], args['rx_wordlength'],
+                                                 args['tx_samplerate'], args['tx_wordlength'], args['frame_size'], args.get('stream_duration'))
+
+    def runCtrlPort(self, args):
+        '''
+        args: bin_file, cp_dl_script
+        '''
+        self.lnk_mod.bin2CtrlPort(args['bin_file'], args['cp_dl_script'])
+        return outputName(args['cp_dl_script'], self.lnk_mod.output_compression)
+
+    def runDataPort(self, args):
+        '''
+        args: bin_file, dp_file
+        '''
+        self.bin2lnk.bin2Dp(args['bin_file'], args['dp_file'])
+        return outputName(args['dp_file'], self.bin2lnk.output_compression)
+
+    def checkArgs(self, request):
+        '''
+        check job and argument types of a request
+        return error message, None if request is valid
+        '''
+        if not isinstance(request, dict) or request.get('job') not in self.job_types:
+            return "unknown job {0}" .format(request.get('job') if isinstance(request, dict) else None)
+        args = request.get('args', {})
+        if not isinstance(args, dict):
+            return "args must be an object"
+        for (name, (types, required)) in job_arg_types[request['job']].items():
+            if name not in args:
+                if required:
+                    return "missing argument {0}" .format(name)
+            elif args[name] is None and not required:
+                continue
+            elif not isinstance(args[name], types) or isinstance(args[name], bool):
+                return "invalid argument {0}: {1!r}" .format(name, args[name])
+        return None
+
+    def submit(self, request, reply):
+        '''
+        queue one job request
+            reply: callback to send response dict
+        return event set when job is answered
+        '''
+        done = threading.Event()
+        error = self.checkArgs(request)
+        if error:
+            reply({'id' : request.get('id') if isinstance(request, dict) else None, 'status' : 'error', 'error' : error})
+            done.set()
+        else:
+            self.jobs.put((request, reply, done))
+            reply({'id' : request.get('id'), 'status' : 'queued'})
+        return done
+
+    def worker(self):
+        '''
+        worker thread: run queued jobs till None
+        '''
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                break
+            (request, reply, done) = item
+            start = time.time()
+            try:
+                result = self.job_types[request['job']](request.get('args', {}))
+                reply({'id' : request.get('id'), 'status' : 'done', 'result' : result, 'time_ms' : (time.time() - start) * 1000})
+            except Exception as e:
+                #any failure is reported to the client, the worker keeps serving
+                tblog.infoLog("LnK daemon job {0} failed: {1!r}" .format(request.get('id'), e))
+                reply({'id' : request.get('id'), 'status' : 'error', 'error' : "{0}: {1}" .format(type(e).__name__, e)})
+            finally:
+                done.set()
+
+    '''
+    ##############################################################
+       server
+    ##############################################################
+    '''
+    def serve(self):
+        '''
+        start worker pool and serve requests until shutdown()
+        '''
+        if isinstance(self.address, tuple):
+            self.server = LnkTCPServer(self.address, LnkJobHandler)
+        else:
+            if os.path.exists(self.address):
+                os.remove(self.address)     #stale socket from last run
+            self.server = LnkUnixServer(self.address, LnkJobHandler)
+        self.server.lnk_daemon = self
+
+        pool = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self.worker)
+            t.daemon = True
+            t.start()
+            pool.append(t)
+
+        tblog.infoLog("LnK daemon serving on {0}" .format(self.address))
+        try:
+            self.server.serve_forever()
+        finally:
+            for t in pool:
+                self.jobs.put(None)
+            self.server.server_close()
+            if not isinstance(self.address, tuple) and os.path.exists(self.address):
+                os.remove(self.address)
+
+    def shutdown(self):
+        '''
+        stop serve() from another thread
+        '''
+        if self.server:
+            self.server.shutdown()
+
+
+class LnkGenClient(object):
+    '''
+    client of LnK generation daemon
+    '''
+    def __init__(self, address=default_address):
+        self.address = address
+
+    def run(self, jobs):
+        '''
+        send jobs and yield final responses as they finish
+            jobs: list of (job, args dict)
+        '''
+        if isinstance(self.address, tuple):
+            sock = socket.create_connection(self.address)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.address)
+        try:
+            for (i, (job, args)) in enumerate(jobs):
+                sock.sendall(json.dumps({'id' : i, 'job' : job, 'args' : args}) + '\n')
+            sock.shutdown(socket.SHUT_WR)
+
+            for line in sock.makefile('r'):
+                response = json.loads(line)
+                if response['status'] != 'queued':
+                    yield response
+        finally:
+            sock.close()
+
+    def submit(self, job, **args):
+        '''
+        run one job and return its result
+        '''
+        for response in self.run([(job, args)]):
+            if response['status'] == 'error':
+                raise BellagioError("LnK daemon: {0}" .format(response['error']))
+            return response['result']
+
+if __name__ == "__main__":
+    tblog.setDebugMode(True)
+    address = default_address
+    if len(sys.argv) > 1:
+        if sys.argv[1].isdigit():
+            address = ('127.0.0.1', int(sys.argv[1]))
+        else:
+            address = sys.argv[1]
+    workers = 4
+    if len(sys.argv) > 2:
+        workers = int(sys.argv[2])
+    output_path = None
+    if len(sys.argv) > 3:
+        output_path = sys.argv[3]
+    lnk_daemon = LnkGenDaemon(address, workers, output_path)
+    lnk_daemon.serve()
@@ -0,0 +1,175 @@
+'''
+lnk_output:
+buffered background output and transparent input of generated LnK files
+    OutputSink is file like: rendered text is collected into large blocks, blocks are(gzip/xz compressed and)
+    written by a background thread through a bounded queue, so rendering overlaps compression and disk I/O
+    openInput reads plain or compressed files, so tools can take either
+
+Created on 10/19/2026
+'''
+
+import bellagio.SystemLib.testbed_logging.testbedlog as tblog
+from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
+import os
+import gzip
+import zlib
+import time
+import threading
+import Queue
+
+#xz is optional: python 3 lzma or backports.lzma
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+#compression : file name suffix
+compress_suffix = {
+    'gz'    : '.gz',
+    'xz'    : '.xz',
+    }
+
+
+def outputName(out_name, compression=None):
+    '''
+    file name of output with compression suffix
+    '''
+    if not compression:
+        return out_name
+    if compression not in compress_suffix:
+        raise BellagioError("lnk_output: unknown compression {0}!" .format(compression))
+    if compression == 'xz' and lzma is None:
+        raise BellagioError("lnk_output: xz needs lzma or backports.lzma!")
+    return out_name + compress_suffix[compression]
+
+
+def openInput(in_name, mode='rb'):
+    '''
+    open plain or compressed LnK file for read
+        in_name: file name with or without compression suffix(".gz"/".xz" is tried if plain file is missing)
+    '''
+    if not os.path.isfile(in_name):
+        for suffix in compress_suffix.values():
+            if os.path.isfile(in_name + suffix):
+                in_name += suffix
+                break
+    if in_name.endswith(compress_suffix['gz']):
+        return gzip.open(in_name, mode)
+    if in_name.endswith(compress_suffix['xz']):
+        if lzma is None:
+            raise BellagioError("lnk_output: xz needs lzma or backports.lzma!")
+        return lzma.open(in_name, mode)
+    return open(in_name, mode)
+
+
+class OutputSink(object):
+    '''
+    file like double-buffered writer: one block is filled by the generator while queued blocks are
+    compressed(optional) and written to out_file by the background thread
+    '''
+    block_size = 1 << 20    #raw bytes per block
+    queue_depth = 2         #blocks waiting for background thread, bounds memory to ~(queue_depth + 2) blocks
+
+    def __init__(self, out_file, compression=None, level=6, text=True):
+        '''
+            compression: None, 'gz' or 'xz'
+            text: text mode output, "\n" of compressed stream is written as os.linesep like a plain text file
+                  (plain out_file opened in text mode translates itself)
+        '''
+        if compression == 'gz':
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)    #gzip stream
+        elif compression == 'xz':
+            if lzma is None:
+                raise BellagioError("lnk_output: xz needs lzma or backports.lzma!")
+            self.compressor = lzma.LZMACompressor(preset=level)
+        elif compression:
+            raise BellagioError("lnk_output: unknown compression {0}!" .format(compression))
+        else:
+            self.compressor = None
+        self.out_file = out_file
+        self.linesep = os.linesep if compression and text and os.linesep != '\n' else None
+        self.name = getattr(out_file, 'name', '')
+        self.buffer = []
+        self.buffer_size = 0
+        self.raw_bytes = 0
+        self.out_bytes = 0
+        self.error = None
+        self.aborted = False
+        self.start = time.time()
+        self.blocks = Queue.Queue(self.queue_depth)
+        self.thread = threading.Thread(target=self.writeBlocks)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.buffer_size += len(text)
+        if self.buffer_size >= self.block_size:
+            self.flushBlock()
+
+    def flushBlock(self):
+        if self.error:
+            raise BellagioError("lnk_output: writing {0} failed: {1}" .format(self.name, self.error))
+        if self.buffer:
+            block = ''.join(self.buffer)
+            if self.linesep:
+                block = block.replace('\n', self.linesep)
+            self.blocks.put(block)
+            self.raw_bytes += self.buffer_size
+            self.buffer = []
+            self.buffer_size = 0
+
+    def writeBlocks(self):
+        '''
+        background thread: compress and write blocks till None
+        '''
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            if self.error or self.aborted:
+                continue    #drain queue
+            try:
+                if self.compressor:
+                    block = self.compressor.compress(block)
+                self.out_file.write(block)
+                self.out_bytes += len(block)
+            except Exception as e:
+                self.error = e
+        if self.compressor and not self.error and not self.aborted:
+            try:
+                data = self.compressor.flush()
+                self.out_file.write(data)
+                self.out_bytes += len(data)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        '''
+        write out last block and wait for background thread, report compression ratio and speed
+        '''
+        try:
+            self.flushBlock()
+        finally:
+            self.blocks.put(None)
+            self.thread.join()
+        if self.error:
+            raise BellagioError("lnk_output: writing {0} failed: {1}" .format(self.name, self.error))
+        elapsed = max(time.time() - self.start, 1e-6)
+        if self.compressor:
+            tblog.infoLog("lnk_output: {0} {1} -> {2} bytes ratio {3:.1f} {4:.1f}MB/s" .format(self.name, self.raw_bytes, self.out_bytes,
+                                                                                             float(self.raw_bytes) / max(self.out_bytes, 1), self.raw_bytes / elapsed / 1e6))
+        else:
+            tblog.infoLog("lnk_output: {0} {1} bytes {2:.1f}MB/s" .format(self.name, self.raw_bytes, self.raw_bytes / elapsed / 1e6))
+
+    def abort(self):
+        '''
+        stop background thread without writing out buffered blocks(output is discarded)
+        '''
+        self.aborted = True
+        self.buffer = []
+        self.blocks.put(None)
+        self.thread.join()
@@ -0,0 +1,98 @@
+'''
+lnk_progress:
+progress report and cancellation for long LnK conversions(bin2Dp/bin2txt/bin2CtrlPort)
+    conversions call LnkProgress.update() once per chunk: it reports bytes done, dwords/s and ETA to
+    the caller's callback and stops the conversion if the cancel token is set
+    output is written to "<name>.part" and renamed when complete, so a cancelled conversion leaves no partial file
+    output is buffered and written by a background thread, and can be gzip/xz compressed on the fly(see lnk_output)
+
+Created on 10/19/2026
+'''
+
+from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
+from bellagio.SystemLib.LnK.lnk_output import OutputSink, outputName
+import os
+import time
+import threading
+import contextlib
+
+
+class LnkCancelled(BellagioError):
+    '''
+    conversion stopped by cancel token
+    '''
+    pass
+
+
+class CancelToken(object):
+    '''
+    cancellation token, can be set from any thread(UI tool/CI runner)
+    '''
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def isCancelled(self):
+        return self.event.is_set()
+
+    def check(self, name=''):
+        if self.event.is_set():
+            raise LnkCancelled("{0} cancelled!" .format(name))
+
+
+class LnkProgress(object):
+    '''
+    progress of one conversion
+        callback(done_bytes, total_bytes, dwords_per_sec, eta_sec), None for no report
+        cancel: CancelToken, None if not cancellable
+    '''
+    def __init__(self, name, total, callback=None, cancel=None):
+        self.name = name
+        self.total = total          #input bytes
+        self.callback = callback
+        self.cancel = cancel
+        self.start = time.time()
+        if cancel:
+            cancel.check(name)
+
+    def update(self, done):
+        '''
+        report "done" bytes of input converted, raise LnkCancelled if cancelled before the end
+        '''
+        if self.cancel and done < self.total:
+            self.cancel.check(self.name)
+        if self.callback:
+            elapsed = time.time() - self.start
+            rate = done / 4 / elapsed if elapsed > 0 else 0.0
+            eta = (self.total - done) / 4 / rate if rate > 0 else None
+            self.callback(done, self.total, rate, eta)
+
+
+@contextlib.contextmanager
+def atomicOutput(out_name, mode='w', compression=None):
+    '''
+    open "<out_name>.part" for writing and rename it to out_name only if the block completes
+    output goes through OutputSink, so encoding and disk I/O overlap
+        compression: None, 'gz' or 'xz'(out_name gets ".gz"/".xz" suffix)
+    '''
+    out_name = outputName(out_name, compression)
+    part_name = out_name + '.part'
+    out_file = open(part_name, 'wb' if compression else mode)
+    sink = None
+    try:
+        sink = OutputSink(out_file, compression, text='b' not in mode)
+        sink.name = out_name
+        yield sink
+        sink.close()
+    except:
+        if sink:
+            sink.abort()
+        out_file.close()
+        os.remove(part_name)
+        raise
+    out_file.close()
+    if os.name == 'nt' and os.path.exists(out_name):
+        os.remove(out_name)     #rename does not replace on windows
+    os.rename(part_name, out_name)
@@ -0,0 +1,208 @@
+'''
+lnk_validator:
+streaming structural validator for generated LnK script
+    frame rows/cols are known and match programmed SCP_FrameCtrl
+    "Event #" numbers are increasing
+    <Loop>/<Swframe> are balanced
+    no template placeholder is left
+script is scanned in fixed size chunks with one token regex, so memory is constant for any script size
+
+Created on 10/19/2026
+'''
+
+import bellagio.SystemLib.testbed_logging.testbedlog as tblog
+from bellagio.SystemLib.LnK.LnkScriptMod import swire_rows_ctrl, swire_cols_ctrl
+from bellagio.SystemLib.LnK.lnk_output import openInput
+import re
+import sys
+import operator
+from itertools import imap
+
+#structure tokens, all start with "<" so the regex scan is fast
+script_token = re.compile(
+    r'<(?:Swframe Repeat="(?P<frame>\d+)" rows="(?P<rows>\d+)" cols="(?P<cols>\d+)"'
+    r'|(?P<frame_end>/Swframe>)'
+    r'|Loop Repeat="(?P<loop>\d+)"'
+    r'|(?P<loop_end>/Loop>)'
+    r'|(?P<reset>Reset )'
+    r'|controlword opcode="3" DeviceAddress="\d+" RegisterAddress="0x0*70" Data="0x(?P<data>[0-9a-fA-F]+)")'
+    )
+
+#event numbers, checked per chunk
+script_event = re.compile(r'<!-- Event #(\d+) ')
+
+#template placeholders: fixed names and "_NAME_" style
+template_placeholders = ('_DATE_', 'reg_addr', 'event_num', '0xdata')
+template_placeholder = re.compile(r'_[A-Z][A-Z0-9_]*_')
+
+#SCP_FrameCtrl: rows/cols after reset
+swire_default_shape = (48, 2)
+
+
+class LnkScriptValidator(object):
+    '''
+    validate LnK script in one streaming pass
+    '''
+    ROBOT_LIBRARY_SCOPE = 'GLOBAL'
+
+    def __init__(self, chunk_size=1 << 22, max_errors=100):
+        self.chunk_size = chunk_size        #bytes per read
+        self.max_errors = max_errors        #errors kept for report, rest are only counted
+        self.rows_code = dict([(v, k) for (k, v) in swire_rows_ctrl.items()])
+        self.cols_code = dict([(v, k) for (k, v) in swire_cols_ctrl.items()])
+
+    def error(self, line_no, msg):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_no, msg))
+
+    def shapeStr(self, shape):
+        return (str(shape[0]), str(shape[1]))
+
+    def checkEvents(self, chunk, chunk_line, last_event):
+        '''
+        check "Event #" numbers of chunk are increasing
+        return last event number
+        '''
+        events = [last_event] + map(int, script_event.findall(chunk))
+        if not all(imap(operator.lt, events, events[1:])):
+            #locate errors, rare
+            for found in script_event.finditer(chunk):
+                event = int(found.group(1))
+                if event <= last_event:
+                    self.error(chunk_line + chunk.count('\n', 0, found.start()), "event #{0} after #{1}" .format(event, last_event))
+                last_event = event
+        return events[-1]
+
+    def scanPlaceholder(self, chunk, chunk_line):
+        '''
+        report template placeholders left in chunk(rare, so line numbers are counted only on hit)
+        '''
+        hits = []
+        for name in template_placeholders:
+            pos = chunk.find(name)
+            while pos >= 0:
+                hits.append((pos, name))
+                pos = chunk.find(name, pos + 1)
+        for found in template_placeholder.finditer(chunk):
+            (start, end) = found.span()
+            if (start == 0 or not chunk[start-1].isalnum()) and (end == len(chunk) or not chunk[end].isalnum()) and found.group(0) not in template_placeholders:
+                hits.append((start, found.group(0)))
+        for (pos, name) in hits:
+            self.error(chunk_line + chunk.count('\n', 0, pos), "template placeholder {0} left" .format(name))
+
+    def validate(self, script_file, shape=None):
+        '''
+        validate script
+            shape: (rows, cols) programmed before script start(e.g. route transition script), None for reset shape
+        return list of (line number, error), at most max_errors
+        '''
+        self.errors = []
+        self.error_count = 0
+        self.frames = 0
+
+        shape = tuple(shape or swire_default_shape)     #rows/cols programmed by SCP_FrameCtrl
+        shape_str = self.shapeStr(shape)
+        pending_shape = None            #new shape takes effect after current frame
+        in_frame = False
+        frame_pos = -1                  #position of open frame in current chunk
+        frame_line = 0                  #line of open frame from previous chunk
+        loops = []                      #line numbers of open loops
+        last_event = -1
+
+        chunk_line = 1                  #line number of chunk start
+        rest = ''
+        with openInput(script_file) as script:
+            while True:
+                chunk = script.read(self.chunk_size)
+                if not chunk:
+                    chunk = rest
+                    rest = ''
+                    if not chunk:
+                        break
+                else:
+                    #only scan complete lines, keep the tail for next chunk
+                    chunk = rest + chunk
+                    end = chunk.rfind('\n') + 1
+                    if end == 0:
+                        rest = chunk
+                        continue
+                    (chunk, rest) = (chunk[:end], chunk[end:])
+
+                '''
+                line numbers are only counted for errors, loops and frames open across chunks
+                '''
+                for token in script_token.finditer(chunk):
+                    kind = token.lastgroup
+                    if kind == 'cols':
+                        self.frames += 1
+                        if in_frame:
+                            self.error(chunk_line + chunk.count('\n', 0, token.start()), "Swframe opened inside Swframe from line {0}" .format(frame_line if frame_pos < 0 else chunk_line + chunk.count('\n', 0, frame_pos)))
+                        in_frame = True
+                        frame_pos = token.start()
+                        if token.group(2, 3) != shape_str:
+                            (rows, cols) = (int(token.group(2)), int(token.group(3)))
+                            if rows not in swire_rows_ctrl or cols not in swire_cols_ctrl:
+                                self.error(chunk_line + chunk.count('\n', 0, frame_pos), "frame shape {0}x{1} not in swire_rows_ctrl/swire_cols_ctrl" .format(rows, cols))
+                            else:
+                                self.error(chunk_line + chunk.count('\n', 0, frame_pos), "frame shape {0}x{1} does not match SCP_FrameCtrl {2}x{3}" .format(rows, cols, shape[0], shape[1]))
+                    elif kind == 'frame_end':
+                        if not in_frame:
+                            self.error(chunk_line + chunk.count('\n', 0, token.start()), "</Swframe> without Swframe")
+                        in_frame = False
+                        if pending_shape:
+                            shape = pending_shape
+                            shape_str = self.shapeStr(shape)
+                            pending_shape = None
+                    elif kind == 'data':
+                        #SCP_FrameCtrl write
+                        val = int(token.group('data'), 16)
+                        if (val >> 3) not in self.rows_code or (val & 0x7) not in self.cols_code:
+                            self.error(chunk_line + chunk.count('\n', 0, token.start()), "unknown SCP_FrameCtrl value 0x{0:02x}" .format(val))
+                        else:
+                            pending_shape = (self.rows_code[val >> 3], self.cols_code[val & 0x7])
+                    elif kind == 'loop':
+                        line_no = chunk_line + chunk.count('\n', 0, token.start())
+                        if in_frame:
+                            self.error(line_no, "Loop inside Swframe from line {0}" .format(frame_line if frame_pos < 0 else chunk_line + chunk.count('\n', 0, frame_pos)))
+                        loops.append(line_no)
+                    elif kind == 'loop_end':
+                        if not loops:
+                            self.error(chunk_line + chunk.count('\n', 0, token.start()), "</Loop> without Loop")
+                        else:
+                            loops.pop()
+                    elif kind == 'reset':
+                        shape = swire_default_shape
+                        shape_str = self.shapeStr(shape)
+                        pending_shape = None
+
+                last_event = self.checkEvents(chunk, chunk_line, last_event)
+                self.scanPlaceholder(chunk, chunk_line)
+
+                if in_frame and frame_pos >= 0:
+                    frame_line = chunk_line + chunk.count('\n', 0, frame_pos)
+                frame_pos = -1
+                chunk_line += chunk.count('\n')
+        script.close()
+
+        if in_frame:
+            self.error(frame_line, "Swframe not closed")
+        for line_no in loops:
+            self.error(line_no, "Loop not closed")
+
+        self.errors.sort()
+        tblog.infoLog("LnK script validator: {0} frames {1} errors in {2}" .format(self.frames, self.error_count, script_file))
+        return self.errors
+
+if __name__ == "__main__":
+    validator = LnkScriptValidator()
+    failed = 0
+    for script_file in sys.argv[1:]:
+        errors = validator.validate(script_file)
+        for (line_no, msg) in errors:
+            print "{0}:{1}: {2}" .format(script_file, line_no, msg)
+        if validator.error_count > len(errors):
+            print "{0}: {1} more errors" .format(script_file, validator.error_count - len(errors))
+        if validator.error_count:
+            failed = 1
+    sys.exit(failed)
@@ -0,0 +1,174 @@
+'''
+stimulus:
+generate SWIRE data stream test vector(PCM or 1-bit PDM) file for LnK script
+
+Created on 10/19/2026
+'''
+
+import bellagio.SystemLib.testbed_logging.testbedlog as tblog
+from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
+from bellagio.SystemLib.LnK.lnk_progress import atomicOutput
+import binascii
+import numpy as np
+from __builtin__ import classmethod
+
+
+class SwireStimulus(object):
+    '''
+    Singleton class to generate multi-tone/sweep/noise stimulus
+        output is LnK DP txt format: one 32-bit word per line in hex
+        PCM: one sample per word, two's complement in low "wordlength" bits
+        PDM: 32 1-bit samples per word, first sample in MSB
+    '''
+    ROBOT_LIBRARY_SCOPE = 'GLOBAL'
+
+    _instance = None
+    chunk_size = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(SwireStimulus, cls).__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self):
+        if self.chunk_size == None:
+            self.chunk_size = 1 << 20                   #samples per chunk, multiple of 32 for PDM packing
+            self.waves = {
+                'sine'      : self.genMultiTone,
+                'multitone' : self.genMultiTone,
+                'sweep'     : self.genSweep,
+                'noise'     : self.genNoise,
+                }
+            tblog.infoLog("stimulus initialization")
+
+    @classmethod
+    def getInstance(cls):
+        '''
+        This will ensure only one time (first) initialization for object. Will be used for UI tool.
+        '''
+        if not cls._instance:
+            cls._instance = SwireStimulus()
+        return cls._instance
+
+    '''
+    ##############################################################
+       waveform: return float samples(full scale 1.0) for sample index n
+    ##############################################################
+    '''
+    def genMultiTone(self, n, fs, tones=((1000, -3),), **kwargs):
+        '''
+        sum of sine tones
+            tones: list of (freq(Hz), amplitude(dBFS))
+        '''
+        x = np.zeros(len(n))
+        for (freq, amp) in tones:
+            #keep phase in [0, fs) to hold precision for long streams
+            phase = np.mod(n * float(freq), fs) * (2 * np.pi / fs)
+            x += (10 ** (amp / 20.0)) * np.sin(phase)
+        return x
+
+    def genSweep(self, n, fs, f_start=20, f_stop=20000, amp=-3, sweep_time=1000, log_sweep=True, **kwargs):
+        '''
+        repeating sine sweep
+            f_start/f_stop: sweep range(Hz)
+            sweep_time: time of one sweep(ms)
+        '''
+        period = sweep_time * fs / 1000.0
+        t = np.mod(n, period) / fs
+        T = period / fs
+        if log_sweep:
+            k = np.log(float(f_stop) / f_start)
+            phase = 2 * np.pi * f_start * T / k * (np.exp(t * k / T) - 1)
+        else:
+            phase = 2 * np.pi * (f_start * t + (f_stop - f_start) * t * t / (2 * T))
+        return (10 ** (amp / 20.0)) * np.sin(phase)
+
+    def genNoise(self, n, fs, amp=-6, rng=None, **kwargs):
+        '''
+        uniform white noise
+            amp: peak amplitude(dBFS)
+        '''
+        a = 10 ** (amp / 20.0)
+        return rng.uniform(-a, a, len(n))
+
+    '''
+    ##############################################################
+       encode to swire data word
+    ##############################################################
+    '''
+    def pcm2Word(self, x, wordlength):
+        '''
+        quantize samples to two's complement "wordlength" bits
+        '''
+        full_scale = (1 << (wordlength - 1)) - 1
+        q = np.clip(np.round(x * full_scale), -full_scale - 1, full_scale).astype(np.int64)
+        return (q & ((1 << wordlength) - 1)).astype(np.uint32)
+
+    def pdm2Word(self, x, state):
+        '''
+        1st order sigma-delta modulation, 32 bits packed per word
+            the modulator bit is the carry of accumulating (x+1)/2, so it is a cumsum instead of a sample loop
+            state: accumulator fraction carried between chunks
+        return (words, new state)
+        '''
+        acc = np.cumsum((np.clip(x, -1.0, 1.0) + 1.0) * 0.5)
+        acc += state
+        carry = np.floor(acc)
+        bits = np.diff(np.concatenate(([0.0], carry))).astype(np.uint8)
+        words = np.packbits(bits).view('>u4').astype(np.uint32)
+        return words, acc[-1] - carry[-1]
+
+    def writeWords(self, out_file, words):
+        '''
+        write words as 8-char hex lines, same format as Bin2Lnk.bin2Dp
+        '''
+        hex_chars = np.frombuffer(binascii.hexlify(words.astype('>u4').tobytes()).upper(), dtype=np.uint8)
+        lines = np.empty((len(words), 9), dtype=np.uint8)
+        lines[:, :8] = hex_chars.reshape(-1, 8)
+        lines[:, 8] = ord('\n')
+        out_file.write(lines.tobytes())
+
+    def genStimulus(self, out_name, wave, samplerate, wordlength, duration, pdm=False, seed=0, compression=None, **params):
+        '''
+        generate stimulus file
+            out_name:   output file name
+            wave:       sine/multitone/sweep/noise
+            samplerate: sample rate(KHz), PDM bit rate for PDM
+            wordlength: PCM word length(bit), ignored for PDM
+            duration:   stimulus time(ms)
+            pdm:        1-bit PDM if True, else PCM
+            compression: None, 'gz' or 'xz'(see lnk_output)
+            params:     waveform parameters(see genMultiTone/genSweep/genNoise)
+        return number of samples
+        '''
+        if wave not in self.waves:
+            raise BellagioError("stimulus: unknown waveform {0}!" .format(wave))
+        if not pdm and not (1 < wordlength <= 32):
+            raise BellagioError("stimulus: invalid PCM word length {0}!" .format(wordlength))
+
+        fs = samplerate * 1000.0
+        total = int(np.ceil(duration * samplerate))
+        if pdm:
+            total = (total + 31) & ~31      #PDM: pad to whole words
+        tblog.infoLog("stimulus: {0} {1} samples at {2}KHz {3} -> {4}" .format(wave, total, samplerate, 'PDM' if pdm else 'PCM', out_name))
+
+        gen = self.waves[wave]
+        rng = np.random.RandomState(seed)
+        state = 0.0
+        with atomicOutput(out_name, 'wb', compression) as out_file:
+            for start in range(0, total, self.chunk_size):
+                n = np.arange(start, min(start + self.chunk_size, total), dtype=np.float64)
+                x = gen(n, fs, rng=rng, **params)
+                if pdm:
+                    words, state = self.pdm2Word(x, state)
+                else:
+                    words = self.pcm2Word(x, wordlength)
+                self.writeWords(out_file, words)
+
+        tblog.infoLog("stimulus done!")
+        return total
+
+if __name__ == "__main__":
+    tblog.setDebugMode(True)
+    stimulus = SwireStimulus.getInstance()
+    stimulus.genStimulus("pdm_sweep.txt", 'sweep', 3072, 1, 1000, pdm=True)
@@ -0,0 +1,327 @@
+'''
+swire_frames:
+compact intermediate representation(IR) of SWIRE bus transactions in LnK script
+    frames(ping, register read/write, data stream start), loops and raw script text are records
+    stored column-wise in packed arrays, so millions of frames take ~24 bytes each
+serializers turn IR into LnK script xml, csv or a binary dump
+
+Created on 10/19/2026
+'''
+
+from bellagio.SystemLib.TestbedException.BellagioError import BellagioError
+from array import array
+import struct
+
+#record kind
+FRAME_PING          = 0     #ping/delay frame: repeat, ssp
+FRAME_RW            = 1     #register read(opcode 2)/write(opcode 3) frame: dev, addr, data
+FRAME_STREAM_START  = 2     #data stream start frame: data = channel enable
+LOOP_START          = 3     #<Loop>: repeat = loop count
+LOOP_END            = 4     #</Loop>
+TEXT                = 5     #raw script text: note = string index
+
+#record flags
+FLAG_EVENT  = 0x1   #write "Event #" comments, event = event number of frame start(CP download style)
+FLAG_UPPER  = 0x2   #upper case data hex
+FLAG_GAP    = 0x4   #write " " line after frame
+
+#opcode name in event comments
+opcode_name = {
+    0 : 'PING',
+    2 : 'READ',
+    3 : 'WRITE',
+    }
+
+#columns: (name, array type)
+frame_columns = (
+    ('kind',    'B'),
+    ('flags',   'B'),
+    ('repeat',  'I'),
+    ('rows',    'H'),
+    ('cols',    'B'),
+    ('opcode',  'B'),
+    ('ssp',     'B'),
+    ('dev',     'B'),
+    ('addr',    'H'),
+    ('data',    'B'),
+    ('event',   'I'),
+    ('note',    'I'),
+    )
+
+
+class SwireFrames(object):
+    '''
+    IR of SWIRE bus transactions
+        note: string index of raw text(TEXT) or text inside frame after control word(frames)
+    '''
+    __slots__ = [name for (name, typecode) in frame_columns] + ['strings', 'string_index']
+
+    def __init__(self):
+        for (name, typecode) in frame_columns:
+            setattr(self, name, array(typecode))
+        self.strings = ['']
+        self.string_index = {'' : 0}
+
+    def __len__(self):
+        return len(self.kind)
+
+    def intern(self, text):
+        '''
+        return string index of text, each distinct string is stored once
+        '''
+        index = self.string_index.get(text)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(text)
+            self.string_index[text] = index
+        return index
+
+    def add(self, kind, flags=0, repeat=1, rows=48, cols=2, opcode=0, ssp=0, dev=0, addr=0, data=0, event=0, note=''):
+        '''
+        append one record
+        '''
+        self.kind.append(kind)
+        self.flags.append(flags)
+        self.repeat.append(repeat)
+        self.rows.append(rows)
+        self.cols.append(cols)
+        self.opcode.append(opcode)
+        self.ssp.append(ssp)
+        self.dev.append(dev)
+        self.addr.append(addr)
+        self.data.append(data)
+        self.event.append(event)
+        self.note.append(self.intern(note))
+
+    def addPing(self, repeat=1, ssp=0, rows=48, cols=2):
+        self.add(FRAME_PING, repeat=repeat, rows=rows, cols=cols, ssp=ssp)
+
+    def addRw(self, write, dev, addr, data, rows=48, cols=2):
+        self.add(FRAME_RW, rows=rows, cols=cols, opcode=3 if write else 2, dev=dev, addr=addr, data=data&0xff)
+
+    def addStreamStart(self, ch_en, rows=48, cols=2):
+        self.add(FRAME_STREAM_START, rows=rows, cols=cols, data=ch_en)
+
+    def addLoop(self, repeat):
+        self.add(LOOP_START, repeat=repeat)
+
+    def addLoopEnd(self):
+        self.add(LOOP_END)
+
+    def addText(self, text):
+        self.add(TEXT, note=text)
+
+    def write(self, text):
+        '''
+        file like write: keep raw script text, so text writers can take IR as output
+        '''
+        self.addText(text)
+
+    def extend(self, other):
+        '''
+        append all records of other IR
+        '''
+        notes = [self.intern(text) for text in other.strings]
+        for (name, typecode) in frame_columns:
+            if name != 'note':
+                getattr(self, name).extend(getattr(other, name))
+        self.note.extend(array('I', [notes[i] for i in other.note]))
+
+    def extendBlock(self, block, count, data=None, event=None):
+        '''
+        append "count" copies of block IR
+            data:   data column of all copies, None to copy block data
+            event:  event column of all copies, None to copy block events
+        '''
+        notes = array('I', [self.intern(text) for text in block.strings])
+        for (name, typecode) in frame_columns:
+            if name == 'note':
+                self.note.extend(array('I', [notes[i] for i in block.note]) * count)
+            elif name == 'data' and data is not None:
+                self.data.extend(array('B', data))
+            elif name == 'event' and event is not None:
+                self.event.extend(array('I', event))
+            else:
+                getattr(self, name).extend(getattr(block, name) * count)
+
+    def records(self):
+        '''
+        iterate records as tuples in column order, note replaced by its text
+        '''
+        columns = [getattr(self, name) for (name, typecode) in frame_columns]
+        strings = self.strings
+        for record in zip(*columns):
+            yield record[:-1] + (strings[record[-1]],)
+
+    def transactions(self):
+        '''
+        iterate control port register transactions: (index, opcode, dev, addr, data, event)
+        '''
+        for i in range(len(self.kind)):
+            if self.kind[i] == FRAME_RW:
+                for r in range(self.repeat[i]):
+                    yield (i, self.opcode[i], self.dev[i], self.addr[i], self.data[i], self.event[i])
+
+    def memSize(self):
+        '''
+        bytes used by record columns
+        '''
+        return sum([getattr(self, name).itemsize * len(getattr(self, name)) for (name, typecode) in frame_columns])
+
+'''
+##############################################################
+   serializers
+##############################################################
+'''
+class LnkXmlSerializer(object):
+    '''
+    write IR as LnK script xml
+    '''
+    frame_start = '<Swframe Repeat="%d" rows="%d" cols="%d" preq="0" StaticSync="177" Phy="0" DynamicSync="Valid" Parity="Valid" nak="0" ack="0" >\n'
+    ping = '   <controlword opcode="0" ssp="%d" breq="0" brel="0" reserved="0" />\n'
+    rw = '   <controlword opcode="%d" DeviceAddress="%d" RegisterAddress="0x%04x" Data="0x%02x" />\n'
+    rw_upper = '   <controlword opcode="%d" DeviceAddress="%d" RegisterAddress="0x%04x" Data="0x%02X" />\n'
+    stream_start = '   <DataStream Id="A1" >\n      <Start ChannelEnable="%d" />\n   </DataStream>\n'
+    frame_end = '</Swframe>\n'
+    event_start = '<!-- Event #%d : Frame Start -->\n'
+    event_cw = '   <!-- Event #%d : %s -->\n'
+    gap = ' \n'
+
+    file_mode = 'w'
+    batch = 4096    #records per file write
+
+    def __init__(self):
+        self.formats = {}   #{(kind, flags, opcode, note) : "%" format of whole frame}
+
+    def frameFormat(self, kind, flags, opcode, note):
+        '''
+        "%" format of a whole frame, fields in order:
+            [event] repeat rows cols [channel enable] [event+1] ssp|(opcode dev addr data)
+        '''
+        fmt = ''
+        if flags & FLAG_EVENT:
+            fmt += self.event_start
+        fmt += self.frame_start
+        if kind == FRAME_STREAM_START:
+            fmt += self.stream_start
+        if flags & FLAG_EVENT:
+            fmt += self.event_cw.replace('%s', opcode_name.get(opcode, 'PING'))
+        if kind == FRAME_RW:
+            if flags & FLAG_UPPER:
+                fmt += self.rw_upper
+            else:
+                fmt += self.rw
+        else:
+            fmt += self.ping
+        fmt += note.replace('%', '%%') + self.frame_end
+        if flags & FLAG_GAP:
+            fmt += self.gap
+        return fmt
+
+    def render(self, frames, start=0, stop=None):
+        '''
+        return list of xml strings of records [start, stop)
+        '''
+        if stop is None or stop > len(frames):
+            stop = len(frames)
+        (kind, flags, repeat, rows, cols, opcode, ssp, dev, addr, data, event, note) = [getattr(frames, name) for (name, typecode) in frame_columns]
+        strings = frames.strings
+        formats = self.formats
+
+        out = []
+        for i in range(start, stop):
+            k = kind[i]
+            if k == TEXT:
+                out.append(strings[note[i]])
+                continue
+            if k == LOOP_START:
+                out.append('<Loop Repeat="%d">\n' % repeat[i])
+                continue
+            if k == LOOP_END:
+                out.append('</Loop>\n')
+                continue
+
+            f = flags[i]
+            key = (k, f, opcode[i], strings[note[i]])
+            fmt = formats.get(key)
+            if fmt is None:
+                fmt = formats[key] = self.frameFormat(*key)
+
+            if k == FRAME_RW:
+                args = (repeat[i], rows[i], cols[i], opcode[i], dev[i], addr[i], data[i])
+            elif k == FRAME_STREAM_START:
+                args = (repeat[i], rows[i], cols[i], data[i], ssp[i])
+            else:
+                args = (repeat[i], rows[i], cols[i], ssp[i])
+            if f & FLAG_EVENT:
+                if k == FRAME_STREAM_START:
+                    args = (event[i],) + args[:4] + (event[i] + 1,) + args[4:]
+                else:
+                    args = (event[i],) + args[:3] + (event[i] + 1,) + args[3:]
+            out.append(fmt % args)
+        return out
+
+    def write(self, frames, out_file):
+        for start in range(0, len(frames), self.batch):
+            out_file.write(''.join(self.render(frames, start, start + self.batch)))
+
+
+class CsvSerializer(object):
+    '''
+    write IR as csv, one record per line
+    '''
+    file_mode = 'w'
+
+    def write(self, frames, out_file):
+        out_file.write(','.join([name for (name, typecode) in frame_columns]) + '\n')
+        for record in frames.records():
+            text = record[-1].strip().replace('"', '""')
+            out_file.write('{0},"{1}"\n' .format(','.join([str(v) for v in record[:-1]]), text))
+
+
+class BinarySerializer(object):
+    '''
+    write IR as binary dump:
+        magic, version, record count, string count
+        columns in frame_columns order(little endian)
+        strings, 0 separated
+    '''
+    magic = 'SWFR'
+    version = 1
+    file_mode = 'wb'
+
+    def write(self, frames, out_file):
+        out_file.write(struct.pack('<4sIII', self.magic, self.version, len(frames), len(frames.strings)))
+        for (name, typecode) in frame_columns:
+            column = getattr(frames, name)
+            if struct.pack('=H', 1) != struct.pack('<H', 1):
+                column = array(typecode, column)
+                column.byteswap()
+            out_file.write(column.tostring())
+        out_file.write('\0'.join(frames.strings))
+
+    def read(self, in_file):
+        '''
+        load IR from binary dump
+        '''
+        (magic, version, count, string_count) = struct.unpack('<4sIII', in_file.read(16))
+        if magic != self.magic or version != self.version:
+            raise BellagioError("swire_frames: not a frame dump!")
+        frames = SwireFrames()
+        for (name, typecode) in frame_columns:
+            column = getattr(frames, name)
+            column.fromstring(in_file.read(count * column.itemsize))
+            if struct.pack('=H', 1) != struct.pack('<H', 1):
+                column.byteswap()
+        frames.strings = in_file.read().split('\0')
+        frames.string_index = dict([(text, i) for (i, text) in enumerate(frames.strings)])
+        if len(frames.strings) != string_count:
+            raise BellagioError("swire_frames: corrupted frame dump!")
+        return frames
+
+#script format : serializer class(file_mode: output file open mode)
+frame_serializers = {
+    'xml'   : LnkXmlSerializer,
+    'csv'   : CsvSerializer,
+    'bin'   : BinarySerializer,
+    }